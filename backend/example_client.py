@@ -2,9 +2,227 @@
 Exemplo de cliente Python para testar a API refatorada
 """
 
+import json
+import random
 import requests
 import time
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson é opcional: sem ele, usa json da stdlib
+    json_loads = json.loads
+
+try:
+    from websockets.sync.client import connect as ws_connect
+except ImportError:  # websockets é opcional: sem ele, usa polling
+    ws_connect = None
+
+try:
+    from requests_toolbelt.multipart.encoder import MultipartEncoder
+except ImportError:  # requests_toolbelt é opcional: sem ele, usa files=
+    MultipartEncoder = None
+
+
+def create_session() -> requests.Session:
+    """
+    Cria sessão HTTP reutilizável (keep-alive + pool de conexões)
+    
+    Evita um novo handshake TCP a cada polling de status
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.5)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+# Sessão compartilhada por todas as chamadas do cliente
+SESSION = create_session()
+
+# Intervalos de polling (backoff exponencial com jitter)
+POLL_INTERVAL_MIN = 1.0
+POLL_INTERVAL_MAX = 30.0
+
+# Long-polling: o servidor segura o GET /status até o job mudar (?wait=N)
+LONG_POLL_WAIT = 30
+
+# Estados em que o job não muda mais
+FINAL_STATUSES = ("done", "error", "cancelled")
+
+# Tamanho dos blocos lidos/escritos no download
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Tentativas de retomar (Range) um download interrompido
+DOWNLOAD_RESUME_ATTEMPTS = 3
+
+
+def upload_file(pdf_path: str, api_url: str) -> requests.Response:
+    """
+    Envia o PDF para POST /upload
+    
+    Com requests_toolbelt o corpo multipart é lido do disco em streaming,
+    sem carregar o arquivo inteiro na memória
+    """
+    with open(pdf_path, 'rb') as f:
+        if MultipartEncoder is None:
+            return SESSION.post(f"{api_url}/upload", files={"file": f})
+        
+        encoder = MultipartEncoder(
+            fields={"file": (Path(pdf_path).name, f, "application/pdf")}
+        )
+        return SESSION.post(
+            f"{api_url}/upload",
+            data=encoder,
+            headers={"Content-Type": encoder.content_type}
+        )
+
+
+def download_export(job_id: str, api_url: str, filename: str) -> requests.Response:
+    """
+    Baixa o Excel de GET /export em streaming (memória constante)
+    
+    Confere os bytes gravados contra o Content-Length; se a transferência
+    vier truncada, retoma de onde parou com "Range: bytes=N-".
+    
+    Returns:
+        Resposta HTTP (arquivo só é gravado se status 200)
+    
+    Raises:
+        IOError: se o arquivo continuar incompleto após as tentativas
+    """
+    url = f"{api_url}/export/{job_id}"
+    written = 0
+    expected = 0
+    
+    for _ in range(DOWNLOAD_RESUME_ATTEMPTS):
+        # identity: Content-Length precisa bater com os bytes gravados
+        headers = {"Accept-Encoding": "identity"}
+        if written:
+            headers["Range"] = f"bytes={written}-"
+        
+        with SESSION.get(url, stream=True, headers=headers) as response:
+            if response.status_code == 206:
+                mode = 'ab'
+            elif response.status_code == 200:
+                # Servidor ignorou o Range: recomeça do zero
+                mode = 'wb'
+                written = 0
+                expected = int(response.headers.get("Content-Length", 0))
+            else:
+                return response
+            
+            try:
+                with open(filename, mode) as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        written += len(chunk)
+            except requests.exceptions.ChunkedEncodingError:
+                # Conexão caiu no meio do corpo: tenta retomar
+                pass
+        
+        if not expected or written == expected:
+            return response
+    
+    raise IOError(f"Download incompleto: {written} de {expected} bytes ({filename})")
+
+
+def next_poll_interval(interval: float, changed: bool) -> float:
+    """
+    Calcula o próximo intervalo de polling
+    
+    Volta ao mínimo quando o job avança; caso contrário cresce
+    exponencialmente (com jitter) até POLL_INTERVAL_MAX
+    """
+    if changed:
+        return POLL_INTERVAL_MIN
+    return min(interval * 1.7 + random.uniform(0, 0.3), POLL_INTERVAL_MAX)
+
+
+def _print_status(status_data: dict, start_time: float):
+    """Mostra uma linha de progresso"""
+    progress = status_data.get("progress", status_data.get("progress_percent", 0.0))
+    elapsed = time.time() - start_time
+    print(f"   {status_data['status'].upper()}: {progress:.1f}% - {status_data['message']} ({elapsed:.1f}s)")
+
+
+def wait_for_job_ws(job_id: str, api_url: str) -> dict:
+    """
+    Aguarda o job via WebSocket (servidor envia cada mudança de estado)
+    
+    Returns:
+        Último status recebido (estado final)
+    """
+    ws_url = api_url.replace("http", "ws", 1)
+    start_time = time.time()
+    status_data = None
+    
+    with ws_connect(f"{ws_url}/ws/status/{job_id}") as ws:
+        for message in ws:
+            status_data = json_loads(message)
+            _print_status(status_data, start_time)
+    
+    if status_data is None:
+        raise ConnectionError("WebSocket encerrado sem mensagens")
+    return status_data
+
+
+def wait_for_job_polling(job_id: str, api_url: str) -> dict:
+    """
+    Aguarda o job consultando GET /status com long-polling
+    
+    Se o servidor responder na hora (sem suporte a ?wait), cai no
+    backoff entre consultas
+    
+    Returns:
+        Status final do job
+    """
+    start_time = time.time()
+    interval = POLL_INTERVAL_MIN
+    etag = None
+    
+    while True:
+        # GET condicional: 304 (sem corpo) enquanto o job não muda
+        headers = {"If-None-Match": etag} if etag else {}
+        params = {"wait": LONG_POLL_WAIT} if etag else {}
+        request_start = time.monotonic()
+        response = SESSION.get(f"{api_url}/status/{job_id}", headers=headers, params=params)
+        changed = response.status_code != 304
+        
+        if changed:
+            etag = response.headers.get("ETag")
+            status_data = json_loads(response.content)
+            _print_status(status_data, start_time)
+            
+            if status_data["status"] in FINAL_STATUSES:
+                return status_data
+        
+        # Long-polling atendido (mudança ou espera completa): consulta de novo já
+        if etag and (changed or time.monotonic() - request_start >= LONG_POLL_WAIT):
+            interval = POLL_INTERVAL_MIN
+            continue
+        
+        # Backoff: só volta a consultar rápido se houve progresso
+        interval = next_poll_interval(interval, changed)
+        time.sleep(interval)
+
+
+def wait_for_job(job_id: str, api_url: str) -> dict:
+    """Aguarda o job via WebSocket, com fallback para polling"""
+    if ws_connect is not None:
+        try:
+            return wait_for_job_ws(job_id, api_url)
+        except Exception as e:
+            print(f"   ⚠️ WebSocket indisponível ({e}), usando polling...")
+    
+    return wait_for_job_polling(job_id, api_url)
 
 
 def process_pdf(pdf_path: str, api_url: str = "http://localhost:8000"):
@@ -20,56 +238,37 @@ def process_pdf(pdf_path: str, api_url: str = "http://localhost:8000"):
     
     # 1. Upload do PDF
     print("\n[1/4] Fazendo upload...")
-    with open(pdf_path, 'rb') as f:
-        response = requests.post(
-            f"{api_url}/upload",
-            files={"file": f}
-        )
+    response = upload_file(pdf_path, api_url)
     
     if response.status_code != 200:
-        print(f"❌ Erro no upload: {response.json()}")
+        print(f"❌ Erro no upload: {json_loads(response.content)}")
         return
     
-    data = response.json()
+    data = json_loads(response.content)
     job_id = data["job_id"]
     print(f"✅ Upload concluído")
     print(f"   Job ID: {job_id}")
     print(f"   Status: {data['status']}")
     
-    # 2. Polling de status
+    # 2. Acompanhamento de status
     print("\n[2/4] Aguardando processamento...")
-    start_time = time.time()
+    status_data = wait_for_job(job_id, api_url)
     
-    while True:
-        response = requests.get(f"{api_url}/status/{job_id}")
-        status_data = response.json()
-        
-        status = status_data["status"]
-        progress = status_data["progress"]
-        message = status_data["message"]
-        
-        elapsed = time.time() - start_time
-        print(f"   {status.upper()}: {progress:.1f}% - {message} ({elapsed:.1f}s)")
-        
-        # Verifica se terminou
-        if status == "done":
-            print("✅ Processamento concluído")
-            break
-        elif status == "error":
-            print(f"❌ Erro: {message}")
-            return
-        
-        time.sleep(2)  # Aguarda 2 segundos antes de checar novamente
+    if status_data["status"] != "done":
+        print(f"❌ Erro: {status_data['message']}")
+        return
+    
+    print("✅ Processamento concluído")
     
     # 3. Buscar resultado
     print("\n[3/4] Buscando resultado...")
-    response = requests.get(f"{api_url}/result/{job_id}")
+    response = SESSION.get(f"{api_url}/result/{job_id}")
     
     if response.status_code != 200:
-        print(f"❌ Erro ao buscar resultado: {response.json()}")
+        print(f"❌ Erro ao buscar resultado: {json_loads(response.content)}")
         return
     
-    result = response.json()
+    result = json_loads(response.content)
     print("✅ Resultado obtido")
     print(f"   Total de páginas: {result['total_pages']}")
     print(f"   Páginas relevantes: {result['relevant_pages']}")
@@ -92,12 +291,10 @@ def process_pdf(pdf_path: str, api_url: str = "http://localhost:8000"):
     
     if export == 's':
         print("📥 Exportando...")
-        response = requests.get(f"{api_url}/export/{job_id}")
+        filename = f"convenio_{job_id[:8]}.xlsx"
+        response = download_export(job_id, api_url, filename)
         
         if response.status_code == 200:
-            filename = f"convenio_{job_id[:8]}.xlsx"
-            with open(filename, 'wb') as f:
-                f.write(response.content)
             print(f"✅ Arquivo salvo: {filename}")
         else:
             print(f"❌ Erro ao exportar: {response.status_code}")
@@ -106,60 +303,89 @@ def process_pdf(pdf_path: str, api_url: str = "http://localhost:8000"):
     print("✨ Processo concluído!")
 
 
-def test_concurrent_uploads(pdf_files: list, api_url: str = "http://localhost:8000"):
+# Limite de uploads simultâneos no teste de concorrência
+MAX_CONCURRENT_UPLOADS = 8
+
+
+async def test_concurrent_uploads_async(pdf_files: list, api_url: str = "http://localhost:8000"):
     """
-    Testa upload concorrente de múltiplos PDFs
+    Testa upload concorrente de múltiplos PDFs (uploads e monitoramento em paralelo)
     
     Args:
         pdf_files: Lista de caminhos de PDFs
         api_url: URL base da API
     """
+    import asyncio
+    import aiohttp
+    
     print(f"🔄 Testando {len(pdf_files)} uploads simultâneos...")
     print("=" * 60)
     
-    job_ids = []
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30)
+    connector = aiohttp.TCPConnector(limit=32, keepalive_timeout=60)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
     
-    # Upload de todos os arquivos
-    print("\n[1/2] Fazendo uploads...")
-    for pdf_path in pdf_files:
-        with open(pdf_path, 'rb') as f:
-            response = requests.post(
-                f"{api_url}/upload",
-                files={"file": f}
-            )
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
         
-        if response.status_code == 200:
-            job_id = response.json()["job_id"]
-            job_ids.append(job_id)
-            print(f"   ✅ {Path(pdf_path).name}: {job_id}")
-        else:
-            print(f"   ❌ {Path(pdf_path).name}: Erro")
-    
-    # Monitora todos os jobs
-    print(f"\n[2/2] Monitorando {len(job_ids)} jobs...")
-    
-    completed = set()
-    
-    while len(completed) < len(job_ids):
-        for job_id in job_ids:
-            if job_id in completed:
-                continue
+        async def upload(pdf_path: str):
+            name = Path(pdf_path).name
+            async with semaphore:
+                with open(pdf_path, 'rb') as f:
+                    # FormData com arquivo aberto: corpo é enviado em streaming
+                    data = aiohttp.FormData()
+                    data.add_field('file', f, filename=name, content_type='application/pdf')
+                    async with session.post(f"{api_url}/upload", data=data) as response:
+                        if response.status != 200:
+                            print(f"   ❌ {name}: Erro")
+                            return None
+                        job_id = (await response.json(loads=json_loads))["job_id"]
             
-            response = requests.get(f"{api_url}/status/{job_id}")
-            status_data = response.json()
+            print(f"   ✅ {name}: {job_id}")
+            return job_id
+        
+        async def monitor(job_id: str):
+            interval = POLL_INTERVAL_MIN
+            last_state = None
             
-            if status_data["status"] in ["done", "error"]:
-                completed.add(job_id)
-                status_emoji = "✅" if status_data["status"] == "done" else "❌"
-                print(f"   {status_emoji} {job_id[:8]}: {status_data['message']}")
+            while True:
+                async with session.get(f"{api_url}/status/{job_id}") as response:
+                    status_data = await response.json(loads=json_loads)
+                
+                if status_data["status"] in FINAL_STATUSES:
+                    status_emoji = "✅" if status_data["status"] == "done" else "❌"
+                    print(f"   {status_emoji} {job_id[:8]}: {status_data['message']}")
+                    return
+                
+                state = (status_data["status"], status_data.get("progress", status_data.get("progress_percent")))
+                interval = next_poll_interval(interval, state != last_state)
+                last_state = state
+                await asyncio.sleep(interval)
+        
+        # Upload de todos os arquivos
+        print("\n[1/2] Fazendo uploads...")
+        results = await asyncio.gather(*(upload(p) for p in pdf_files))
+        job_ids = [job_id for job_id in results if job_id]
         
-        if len(completed) < len(job_ids):
-            time.sleep(2)
+        # Monitora todos os jobs
+        print(f"\n[2/2] Monitorando {len(job_ids)} jobs...")
+        await asyncio.gather(*(monitor(job_id) for job_id in job_ids))
     
     print("\n" + "=" * 60)
     print(f"✨ Todos os {len(job_ids)} jobs concluídos!")
 
 
+def test_concurrent_uploads(pdf_files: list, api_url: str = "http://localhost:8000"):
+    """
+    Testa upload concorrente de múltiplos PDFs
+    
+    Args:
+        pdf_files: Lista de caminhos de PDFs
+        api_url: URL base da API
+    """
+    import asyncio
+    asyncio.run(test_concurrent_uploads_async(pdf_files, api_url))
+
+
 if __name__ == "__main__":
     import sys
     
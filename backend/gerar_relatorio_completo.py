@@ -5,10 +5,12 @@ Igual à análise manual que eu fiz
 
 import sys
 import io
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', line_buffering=False, write_through=False)
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+import orjson
+import pandas as pd
 
 # ID do último job processado
 JOB_ID = input("Digite o JOB_ID do processamento: ").strip()
@@ -17,15 +19,21 @@ print("=" * 100)
 print("RELATÓRIO COMPLETO DE EXTRAÇÃO DE VALORES FINANCEIROS")
 print("=" * 100)
 
+# Sessão com keep-alive e resposta comprimida (JSON de movimentações é repetitivo)
+session = requests.Session()
+session.mount('http://', HTTPAdapter(pool_connections=2, pool_maxsize=2))
+session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+
 # Busca resultado
 try:
-    response = requests.get(f'http://localhost:8000/result/{JOB_ID}')
+    response = session.get(f'http://localhost:8000/result/{JOB_ID}', stream=True)
     if response.status_code != 200:
         print(f"❌ Erro ao buscar resultado: {response.status_code}")
         print(f"   Resposta: {response.text}")
         sys.exit(1)
     
-    data = response.json()
+    # Lê o corpo direto do socket, já descomprimido
+    data = orjson.loads(response.raw.read(decode_content=True))
     
 except Exception as e:
     print(f"❌ Erro ao conectar com API: {e}")
@@ -61,68 +69,57 @@ print("=" * 100)
 
 movimentacoes = convenio_data.get('movimentacoes', [])
 
-# Agrupa por página
-movs_por_pagina = {}
-for mov in movimentacoes:
-    origem = mov.get('origem_documento', 'desconhecida')
-    if origem not in movs_por_pagina:
-        movs_por_pagina[origem] = []
-    movs_por_pagina[origem].append(mov)
+# Colunas numéricas de cada movimentação
+COLUNAS_VALOR = ['entrada', 'saida', 'saldo', 'aplicacao', 'resgate', 'rendimentos']
+ROTULOS_VALOR = ('Entrada', 'Saída', 'Saldo', 'Aplicação', 'Resgate', 'Rendimento')
+
+# Agrupa em DataFrame (agrupamento/ordenação vetorizados)
+df = pd.DataFrame(movimentacoes).reindex(
+    columns=['origem_documento', 'descricao_item', 'texto_original', *COLUNAS_VALOR]
+)
+# astype(str): sem movimentações a coluna vazia vem como float e o .str falharia
+df['origem_documento'] = df['origem_documento'].fillna('desconhecida').astype(str)
+df['descricao_item'] = df['descricao_item'].fillna('Desconhecido')
+df['texto_original'] = df['texto_original'].fillna('')
+df[COLUNAS_VALOR] = df[COLUNAS_VALOR].fillna(0)
 
-# Ordena páginas
-paginas_ordenadas = sorted(movs_por_pagina.keys(), 
-                          key=lambda x: int(x.split('_')[1].split('.')[0]) if '_' in x else 0)
+# Número da página ("pagina_3.png" -> 3); sem número vai para o início
+df['page_num'] = df['origem_documento'].str.extract(r'_(\d+)', expand=False)
+
+ordenado = df.assign(ordem=df['page_num'].fillna(0).astype(int)).sort_values('ordem', kind='stable')
 
 # Mostra cada página
-for pagina in paginas_ordenadas:
-    movs = movs_por_pagina[pagina]
-    page_num = pagina.split('_')[1].split('.')[0] if '_' in pagina else '?'
-    
-    print(f"\n{'─' * 100}")
-    print(f"📄 PÁGINA {page_num} - {len(movs)} valores encontrados")
-    print(f"{'─' * 100}")
+for (_, page_num, _origem), movs in ordenado.groupby(['ordem', 'page_num', 'origem_documento'], sort=False, dropna=False):
+    page_num = page_num if isinstance(page_num, str) else '?'
     
-    # Agrupa por tipo de valor
-    valores_por_tipo = {}
-    for mov in movs:
-        rotulo = mov.get('descricao_item', 'Desconhecido')
-        if rotulo not in valores_por_tipo:
-            valores_por_tipo[rotulo] = []
-        valores_por_tipo[rotulo].append(mov)
+    # Monta a página inteira num buffer e escreve de uma vez
+    linhas = [
+        f"\n{'─' * 100}",
+        f"📄 PÁGINA {page_num} - {len(movs)} valores encontrados",
+        f"{'─' * 100}",
+    ]
     
-    # Mostra cada tipo
-    for rotulo, valores in valores_por_tipo.items():
-        print(f"\n  🏷️  {rotulo}:")
-        for i, mov in enumerate(valores, 1):
-            # Pega o valor principal
-            entrada = mov.get('entrada', 0) or 0
-            saida = mov.get('saida', 0) or 0
-            saldo = mov.get('saldo', 0) or 0
-            aplicacao = mov.get('aplicacao')
-            resgate = mov.get('resgate')
-            rendimento = mov.get('rendimentos')
-            
-            # Monta linha
-            valores_str = []
-            if entrada > 0:
-                valores_str.append(f"Entrada: R$ {entrada:,.2f}")
-            if saida > 0:
-                valores_str.append(f"Saída: R$ {saida:,.2f}")
-            if saldo > 0:
-                valores_str.append(f"Saldo: R$ {saldo:,.2f}")
-            if aplicacao and aplicacao > 0:
-                valores_str.append(f"Aplicação: R$ {aplicacao:,.2f}")
-            if resgate and resgate > 0:
-                valores_str.append(f"Resgate: R$ {resgate:,.2f}")
-            if rendimento and rendimento > 0:
-                valores_str.append(f"Rendimento: R$ {rendimento:,.2f}")
-            
-            print(f"     {i}. {' | '.join(valores_str) if valores_str else 'Valor zerado'}")
+    # Mostra cada tipo de valor (na ordem em que aparece)
+    for rotulo, valores in movs.groupby('descricao_item', sort=False):
+        linhas.append(f"\n  🏷️  {rotulo}:")
+        # Matriz float + máscara de positivos calculadas uma vez por grupo
+        numeros = valores[COLUNAS_VALOR].to_numpy(dtype=float)
+        positivos = numeros > 0
+        for i, (linha_orig, valores_linha, mascara) in enumerate(
+            zip(valores['texto_original'], numeros.tolist(), positivos.tolist()), 1
+        ):
+            valores_str = " | ".join(
+                f"{nome}: R$ {valor:,.2f}"
+                for nome, valor, positivo in zip(ROTULOS_VALOR, valores_linha, mascara)
+                if positivo
+            )
+            linhas.append(f"     {i}. {valores_str or 'Valor zerado'}")
             
             # Mostra linha original (truncada)
-            linha_orig = mov.get('texto_original', '')
             if linha_orig:
-                print(f"        📝 Linha: {linha_orig[:80]}{'...' if len(linha_orig) > 80 else ''}")
+                linhas.append(f"        📝 Linha: {linha_orig[:80]}{'...' if len(linha_orig) > 80 else ''}")
+    
+    sys.stdout.write("\n".join(linhas) + "\n")
 
 # TOTAIS
 print(f"\n{'=' * 100}")
@@ -131,6 +128,18 @@ print(f"{'=' * 100}")
 
 totais = convenio_data.get('totais', {})
 
+# Fallback: soma as colunas quando a API não mandou os totais
+if not totais and not df.empty:
+    somas = df[COLUNAS_VALOR].sum()
+    totais = {
+        'total_entrada': somas['entrada'],
+        'total_saida': somas['saida'],
+        'total_aplicacao': somas['aplicacao'],
+        'total_resgate': somas['resgate'],
+        'total_rendimentos': somas['rendimentos'],
+        'saldo_final': somas['entrada'] - somas['saida'],
+    }
+
 print(f"\n💵 ENTRADAS E SAÍDAS:")
 print(f"   Total Entrada:     R$ {totais.get('total_entrada', 0):>15,.2f}")
 print(f"   Total Saída:       R$ {totais.get('total_saida', 0):>15,.2f}")
@@ -162,7 +171,7 @@ if totais.get('tem_valores_suspeitos'):
 print(f"\n{'=' * 100}")
 print(f"📌 RESUMO EXECUTIVO")
 print(f"{'=' * 100}")
-print(f"✓ {len(movs_por_pagina)} páginas com valores extraídos")
+print(f"✓ {df['origem_documento'].nunique()} páginas com valores extraídos")
 print(f"✓ {len(movimentacoes)} valores financeiros identificados")
 print(f"✓ Sistema baseado em RÓTULOS (não soma números soltos)")
 print(f"✓ Validação de sanidade ativada (bloqueia valores > R$ 1 bilhão)")
@@ -3,25 +3,76 @@ Gerenciador de jobs de processamento OCR
 Thread-safe para uso com ProcessPoolExecutor
 """
 
+import asyncio
+import dataclasses
 import threading
+import time
+from collections import defaultdict, deque
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import AsyncGenerator, Callable, Deque, Dict, Optional, List, Tuple
 from .models import JobMetadata, JobStatus, JobProgress, JobResult
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Estados finais (job não muda mais)
+FINAL_STATUSES = (JobStatus.DONE, JobStatus.ERROR, JobStatus.CANCELLED)
+
+# Número de locks (potência de 2): jobs diferentes raramente disputam o mesmo
+LOCK_SHARDS = 32
+
+# Máximo de jobs em memória (finalizados mais antigos são descartados)
+MAX_JOBS = 10_000
+
 
 class JobManager:
     """
     Gerencia estado e lifecycle dos jobs de OCR
     Thread-safe com locks para acesso concorrente
+    
+    JobMetadata é imutável: cada mudança troca a entrada do dict por uma
+    cópia. Leituras não usam lock; mudanças usam um lock por shard (hash
+    do job_id)
+    
+    Memória limitada: acima de max_jobs, os jobs finalizados há mais
+    tempo são descartados (LRU por ordem de conclusão)
     """
     
-    def __init__(self):
+    # Mensagens fixas por status (PROCESSING/ERROR são montadas por job)
+    _MESSAGE_MAP = {
+        JobStatus.PENDING: "Aguardando processamento",
+        JobStatus.DONE: "Processamento concluído",
+        JobStatus.CANCELLED: "Processamento cancelado"
+    }
+    
+    def __init__(self, max_jobs: int = MAX_JOBS):
         self._jobs: Dict[str, JobMetadata] = {}
+        self._max_jobs = max_jobs
+        # (instante de conclusão, job_id) em ordem de conclusão
+        self._finished: Deque[Tuple[float, str]] = deque()
         self._results: Dict[str, JobResult] = {}
+        # job_id -> (JobMetadata usado, JobProgress montado)
+        self._progress_cache: Dict[str, Tuple[JobMetadata, JobProgress]] = {}
+        self._locks = [threading.Lock() for _ in range(LOCK_SHARDS)]
+        # Lock global apenas para varreduras e remoções (list_jobs/cleanup)
         self._lock = threading.Lock()
+        # Assinantes de progresso (WebSocket): job_id -> [(loop, fila)]
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = defaultdict(list)
+        # Chamadas com o job_id de cada job descartado (cleanup/limite)
+        self._removal_callbacks: List[Callable[[str], None]] = []
+    
+    def on_job_removed(self, callback: Callable[[str], None]):
+        """
+        Registra função chamada com o job_id de cada job descartado
+        
+        Para liberar recursos guardados fora do JobManager (ex.: arquivos
+        de export). Chamada fora dos locks
+        """
+        self._removal_callbacks.append(callback)
+    
+    def _lock_for(self, job_id: str) -> threading.Lock:
+        """Lock do shard responsável pelo job"""
+        return self._locks[hash(job_id) & (LOCK_SHARDS - 1)]
         
     def create_job(self, job_id: str, filename: str, file_path: str) -> JobMetadata:
         """
@@ -35,7 +86,7 @@ class JobManager:
         Returns:
             JobMetadata criado
         """
-        with self._lock:
+        with self._lock_for(job_id):
             if job_id in self._jobs:
                 raise ValueError(f"Job {job_id} já existe")
             
@@ -45,73 +96,136 @@ class JobManager:
                 file_path=file_path,
                 status=JobStatus.PENDING,
                 created_at=datetime.now(),
+                created_at_mono=time.monotonic(),
                 processed_pages=0
             )
             
             self._jobs[job_id] = metadata
             logger.info(f"Job criado: {job_id} - {filename}")
-            
-            return metadata
+        
+        self._evict_if_full()
+        return metadata
     
     def start_job(self, job_id: str, total_pages: int):
-        """Marca job como PROCESSING"""
-        with self._lock:
-            if job_id not in self._jobs:
+        """
+        Marca job como PROCESSING
+        
+        Job já finalizado não volta a PROCESSING (evento atrasado do worker)
+        """
+        with self._lock_for(job_id):
+            job = self._jobs.get(job_id)
+            if job is None:
                 raise ValueError(f"Job {job_id} não encontrado")
+            if job.status in FINAL_STATUSES:
+                return
             
-            self._jobs[job_id].status = JobStatus.PROCESSING
-            self._jobs[job_id].started_at = datetime.now()
-            self._jobs[job_id].total_pages = total_pages
+            job = dataclasses.replace(
+                job,
+                status=JobStatus.PROCESSING,
+                started_at_mono=time.monotonic(),
+                total_pages=total_pages
+            )
+            self._jobs[job_id] = job
+            snapshot = self._snapshot(job)
             
             logger.info(f"Job iniciado: {job_id} ({total_pages} páginas)")
+        
+        self._publish(snapshot)
     
     def update_progress(self, job_id: str, processed_pages: int):
-        """Atualiza contador de páginas processadas"""
-        with self._lock:
-            if job_id not in self._jobs:
+        """
+        Atualiza contador de páginas processadas
+        
+        O progresso chega pela thread de consume_progress, que concorre com
+        a conclusão do job (a fila entrega eventos atrasados): a checagem do
+        estado final e a troca da entrada ficam sob o lock do shard, senão
+        um evento tardio gravaria por cima do job já finalizado
+        """
+        with self._lock_for(job_id):
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINAL_STATUSES:
                 return
             
-            self._jobs[job_id].processed_pages = processed_pages
+            job = dataclasses.replace(job, processed_pages=processed_pages)
+            self._jobs[job_id] = job
+            snapshot = self._snapshot(job)
+        
+        self._publish(snapshot)
     
     def complete_job(self, job_id: str, result: JobResult):
-        """Marca job como DONE e armazena resultado"""
-        with self._lock:
-            if job_id not in self._jobs:
+        """
+        Marca job como DONE e armazena resultado
+        
+        Job já finalizado (ex.: cancelado enquanto o worker rodava) não muda
+        """
+        with self._lock_for(job_id):
+            job = self._jobs.get(job_id)
+            if job is None:
                 raise ValueError(f"Job {job_id} não encontrado")
+            if job.status in FINAL_STATUSES:
+                return
             
-            self._jobs[job_id].status = JobStatus.DONE
-            self._jobs[job_id].completed_at = datetime.now()
+            job = dataclasses.replace(
+                job,
+                status=JobStatus.DONE,
+                completed_at_mono=time.monotonic()
+            )
             self._results[job_id] = result
+            self._jobs[job_id] = job
+            self._finished.append((job.completed_at_mono, job_id))
+            snapshot = self._snapshot(job)
             
             logger.info(f"Job concluído: {job_id} - {result.records_found} registros")
+        
+        self._publish(snapshot)
+        self._evict_if_full()
     
     def fail_job(self, job_id: str, error_message: str):
-        """Marca job como ERROR"""
-        with self._lock:
-            if job_id not in self._jobs:
+        """Marca job como ERROR (job já finalizado não muda)"""
+        with self._lock_for(job_id):
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINAL_STATUSES:
                 return
             
-            self._jobs[job_id].status = JobStatus.ERROR
-            self._jobs[job_id].completed_at = datetime.now()
-            self._jobs[job_id].error_message = error_message
+            job = dataclasses.replace(
+                job,
+                status=JobStatus.ERROR,
+                completed_at_mono=time.monotonic(),
+                error_message=error_message
+            )
+            self._jobs[job_id] = job
+            self._finished.append((job.completed_at_mono, job_id))
+            snapshot = self._snapshot(job)
             
             logger.error(f"Job falhou: {job_id} - {error_message}")
+        
+        self._publish(snapshot)
+        self._evict_if_full()
     
     def cancel_job(self, job_id: str):
-        """Marca job como CANCELLED"""
-        with self._lock:
-            if job_id not in self._jobs:
+        """Marca job como CANCELLED (job já finalizado não muda)"""
+        with self._lock_for(job_id):
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINAL_STATUSES:
                 return
             
-            self._jobs[job_id].status = JobStatus.CANCELLED
-            self._jobs[job_id].completed_at = datetime.now()
+            job = dataclasses.replace(
+                job,
+                status=JobStatus.CANCELLED,
+                completed_at_mono=time.monotonic()
+            )
+            self._jobs[job_id] = job
+            self._finished.append((job.completed_at_mono, job_id))
+            snapshot = self._snapshot(job)
             
             logger.info(f"Job cancelado: {job_id}")
+        
+        self._publish(snapshot)
+        self._evict_if_full()
     
     def get_job(self, job_id: str) -> Optional[JobMetadata]:
         """Retorna metadata de um job"""
-        with self._lock:
-            return self._jobs.get(job_id)
+        return self._jobs.get(job_id)
     
     def get_progress(self, job_id: str) -> Optional[JobProgress]:
         """
@@ -120,72 +234,200 @@ class JobManager:
         Returns:
             JobProgress ou None se não encontrado
         """
-        with self._lock:
+        # JobMetadata é imutável: leitura consistente sem lock
+        job = self._jobs.get(job_id)
+        if not job:
+            return None
+        
+        return self._progress_for(job)
+    
+    def _progress_for(self, job: JobMetadata) -> JobProgress:
+        """
+        JobProgress do job, reaproveitado enquanto o estado não muda
+        
+        O cache guarda o JobMetadata usado na montagem: como toda mudança
+        troca o objeto, comparar por identidade basta para invalidar
+        """
+        cached = self._progress_cache.get(job.job_id)
+        if cached is not None and cached[0] is job:
+            return cached[1]
+        
+        progress = self._build_progress(job)
+        self._progress_cache[job.job_id] = (job, progress)
+        return progress
+    
+    def _build_progress(self, job: JobMetadata) -> JobProgress:
+        """Monta JobProgress a partir do metadata"""
+        # Calcula progresso percentual
+        progress_percent = 0.0
+        if job.total_pages and job.total_pages > 0:
+            progress_percent = (job.processed_pages / job.total_pages) * 100
+        
+        # Mensagem amigável por status
+        if job.status == JobStatus.PROCESSING:
+            message = f"Processando página {job.processed_pages}/{job.total_pages}"
+        elif job.status == JobStatus.ERROR:
+            message = f"Erro: {job.error_message}"
+        else:
+            message = self._MESSAGE_MAP.get(job.status, "")
+        
+        # Dados internos já são válidos: model_construct pula a validação
+        return JobProgress.model_construct(
+            job_id=job.job_id,
+            status=job.status.value,
+            progress_percent=round(progress_percent, 2),
+            total_pages=job.total_pages,
+            processed_pages=job.processed_pages,
+            message=message
+        )
+    
+    def _snapshot(self, job: JobMetadata) -> Optional[Tuple[JobProgress, list]]:
+        """
+        Captura progresso + assinantes do job
+        
+        Returns:
+            (JobProgress, assinantes) ou None se ninguém está ouvindo
+        """
+        subscribers = self._subscribers.get(job.job_id)
+        if not subscribers:
+            return None
+        return self._progress_for(job), list(subscribers)
+    
+    def _publish(self, snapshot: Optional[Tuple[JobProgress, list]]):
+        """Entrega progresso aos assinantes (chamar FORA do lock)"""
+        if snapshot is None:
+            return
+        
+        progress, subscribers = snapshot
+        for loop, queue in subscribers:
+            # Mutações podem vir de outras threads: agenda no loop do assinante
+            loop.call_soon_threadsafe(queue.put_nowait, progress)
+    
+    async def subscribe(self, job_id: str) -> AsyncGenerator[JobProgress, None]:
+        """
+        Stream de progresso do job (push, sem polling)
+        
+        Emite o estado atual e depois um JobProgress a cada mudança,
+        encerrando quando o job chega a um estado final
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        entry = (loop, queue)
+        
+        with self._lock_for(job_id):
             job = self._jobs.get(job_id)
             if not job:
-                return None
-            
-            # Calcula progresso percentual
-            progress_percent = 0.0
-            if job.total_pages and job.total_pages > 0:
-                progress_percent = (job.processed_pages / job.total_pages) * 100
-            
-            # Mensagem amigável por status
-            message_map = {
-                JobStatus.PENDING: "Aguardando processamento",
-                JobStatus.PROCESSING: f"Processando página {job.processed_pages}/{job.total_pages}",
-                JobStatus.DONE: "Processamento concluído",
-                JobStatus.ERROR: f"Erro: {job.error_message}",
-                JobStatus.CANCELLED: "Processamento cancelado"
-            }
-            
-            return JobProgress(
-                job_id=job_id,
-                status=job.status,
-                progress_percent=round(progress_percent, 2),
-                total_pages=job.total_pages,
-                processed_pages=job.processed_pages,
-                message=message_map.get(job.status, "")
-            )
+                return
+            self._subscribers[job_id].append(entry)
+            progress = self._progress_for(job)
+        
+        try:
+            while True:
+                yield progress
+                if progress.status in FINAL_STATUSES:
+                    break
+                progress = await queue.get()
+        finally:
+            with self._lock_for(job_id):
+                subscribers = self._subscribers.get(job_id)
+                if subscribers and entry in subscribers:
+                    subscribers.remove(entry)
+                    if not subscribers:
+                        del self._subscribers[job_id]
+    
+    def consume_progress(self, events):
+        """
+        Aplica os eventos de progresso enviados pelos workers
+        
+        Roda numa thread própria do processo principal: os jobs executam em
+        outros processos e mandam (job_id, evento, valor) por uma fila
+        (multiprocessing.Queue). Eventos de jobs removidos ou já finalizados
+        são ignorados (start_job/update_progress checam sob o lock do job)
+        
+        Args:
+            events: Fila de eventos; None encerra o consumo
+        """
+        while (event := events.get()) is not None:
+            job_id, kind, value = event
+            if kind == "start":
+                try:
+                    self.start_job(job_id, value)
+                except ValueError:
+                    continue  # Job já removido (cleanup/limite)
+            elif kind == "progress":
+                self.update_progress(job_id, value)
     
     def get_result(self, job_id: str) -> Optional[JobResult]:
         """Retorna resultado final de um job DONE"""
-        with self._lock:
-            return self._results.get(job_id)
+        return self._results.get(job_id)
     
     def list_jobs(self, status: Optional[JobStatus] = None) -> List[JobMetadata]:
         """Lista todos os jobs, opcionalmente filtrados por status"""
         with self._lock:
             jobs = list(self._jobs.values())
-            
-            if status:
-                jobs = [j for j in jobs if j.status == status]
-            
-            return sorted(jobs, key=lambda x: x.created_at, reverse=True)
+        
+        if status:
+            jobs = [j for j in jobs if j.status == status]
+        
+        return sorted(jobs, key=lambda x: x.created_at, reverse=True)
     
     def cleanup_old_jobs(self, max_age_hours: int = 24):
         """
-        Remove jobs antigos para evitar vazamento de memória
+        Remove jobs finalizados há mais de max_age_hours
+        
+        Percorre apenas a fila de conclusão (ordenada por tempo), então o
+        custo é proporcional aos jobs expirados, não ao total
         
         Args:
-            max_age_hours: Jobs mais antigos que isso serão removidos
+            max_age_hours: Jobs finalizados há mais tempo que isso serão removidos
         """
+        cutoff = time.monotonic() - max_age_hours * 3600
+        removed = []
+        
         with self._lock:
-            now = datetime.now()
-            to_remove = []
-            
-            for job_id, job in self._jobs.items():
-                # Remove apenas jobs finalizados (DONE, ERROR, CANCELLED)
-                if job.status in [JobStatus.DONE, JobStatus.ERROR, JobStatus.CANCELLED]:
-                    age_hours = (now - job.created_at).total_seconds() / 3600
-                    if age_hours > max_age_hours:
-                        to_remove.append(job_id)
+            while self._finished and self._finished[0][0] < cutoff:
+                _, job_id = self._finished.popleft()
+                if self._remove_finished(job_id):
+                    removed.append(job_id)
+                    logger.info(f"Job removido (cleanup): {job_id}")
+        
+        self._notify_removed(removed)
+    
+    def _evict_if_full(self):
+        """Descarta os jobs finalizados mais antigos acima de max_jobs"""
+        if len(self._jobs) <= self._max_jobs:
+            return
+        
+        removed = []
+        with self._lock:
+            while len(self._jobs) > self._max_jobs and self._finished:
+                _, job_id = self._finished.popleft()
+                if self._remove_finished(job_id):
+                    removed.append(job_id)
+                    logger.info(f"Job removido (limite de {self._max_jobs}): {job_id}")
+        
+        self._notify_removed(removed)
+    
+    def _notify_removed(self, job_ids: List[str]):
+        """Avisa os callbacks de on_job_removed (chamar FORA dos locks)"""
+        for job_id in job_ids:
+            for callback in self._removal_callbacks:
+                try:
+                    callback(job_id)
+                except Exception as e:
+                    logger.warning(f"Erro ao liberar recursos do job {job_id}: {e}")
+    
+    def _remove_finished(self, job_id: str) -> bool:
+        """Remove job finalizado e seus dados (chamar com self._lock)"""
+        with self._lock_for(job_id):
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in FINAL_STATUSES:
+                return False
             
-            for job_id in to_remove:
-                del self._jobs[job_id]
-                if job_id in self._results:
-                    del self._results[job_id]
-                logger.info(f"Job removido (cleanup): {job_id}")
+            del self._jobs[job_id]
+            self._results.pop(job_id, None)
+            self._progress_cache.pop(job_id, None)
+            return True
 
 
 # Singleton global (em produção, usar injeção de dependência)
@@ -0,0 +1,171 @@
+"""
+Armazenamento de jobs em SQLite (compartilhado entre workers do uvicorn)
+
+Substitui o TTLCache em memória do main.py: com --workers 2+, qualquer
+processo enxerga o job criado por outro. Sem lock global: o SQLite
+serializa as escritas e o modo WAL permite leituras concorrentes.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Arquivo do banco (mesmo disco para todos os workers)
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "storage/jobs.db")
+
+# Tempo de vida de um job (mesmo TTL do antigo cache: 1 hora)
+JOB_TTL_SECONDS = 3600
+
+
+class JobStore:
+    """
+    Estado dos jobs persistido em SQLite, com expiração por TTL
+
+    Cada job é um documento JSON; update() faz merge atômico no próprio
+    SQLite (json_patch), então não há leitura-modificação-escrita em Python.
+    Uma conexão por thread (sqlite3 não compartilha conexões entre threads).
+    """
+
+    def __init__(self, db_path: str = JOB_DB_PATH, ttl: int = JOB_TTL_SECONDS):
+        """
+        Inicializa o store e cria a tabela se necessário
+
+        Args:
+            db_path: Caminho do arquivo SQLite
+            ttl: Segundos até o job expirar
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self._local = threading.local()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_content_hash"
+                " ON jobs (json_extract(data, '$.content_hash'))"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        """
+        Conexão da thread atual (criada sob demanda)
+
+        Também por processo: workers do ProcessPoolExecutor (fork) herdam
+        o thread-local do pai, mas não podem reusar a conexão dele.
+        """
+        pid = os.getpid()
+        cached = getattr(self._local, "conn", None)
+        if cached is None or cached[0] != pid:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = cached = (pid, conn)
+        return cached[1]
+
+    def create(self, job_id: str, data: Dict):
+        """
+        Registra um job novo (e descarta os expirados)
+
+        Args:
+            job_id: ID do job
+            data: Estado inicial
+        """
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, data, expires_at) VALUES (?, ?, ?)",
+                (job_id, orjson.dumps(data).decode(), now + self.ttl)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """
+        Busca um job
+
+        Args:
+            job_id: ID do job
+
+        Returns:
+            Estado do job ou None se não existe/expirou
+        """
+        row = self._conn().execute(
+            "SELECT data FROM jobs WHERE job_id = ? AND expires_at > ?",
+            (job_id, time.time())
+        ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def get_fields(self, job_id: str, *fields: str) -> Optional[Dict]:
+        """
+        Busca só alguns campos de um job (json_extract no SQLite)
+
+        Para o polling: não desserializa "items" a cada GET /status.
+        Leitura sem lock (WAL não bloqueia leitores durante escritas).
+
+        Args:
+            job_id: ID do job
+            fields: Nomes dos campos
+
+        Returns:
+            {campo: valor} ou None se não existe/expirou
+        """
+        columns = ", ".join("json_extract(data, ?)" for _ in fields)
+        row = self._conn().execute(
+            f"SELECT {columns} FROM jobs WHERE job_id = ? AND expires_at > ?",
+            (*(f"$.{field}" for field in fields), job_id, time.time())
+        ).fetchone()
+        return dict(zip(fields, row)) if row else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[Tuple[str, str]]:
+        """
+        Busca job vivo (não expirado, sem erro) com o mesmo conteúdo
+
+        Args:
+            content_hash: Hash do PDF enviado
+
+        Returns:
+            (job_id, status) do job mais recente ou None
+        """
+        return self._conn().execute(
+            "SELECT job_id, json_extract(data, '$.status') FROM jobs"
+            " WHERE json_extract(data, '$.content_hash') = ?"
+            " AND json_extract(data, '$.status') != 'error' AND expires_at > ?"
+            " ORDER BY expires_at DESC LIMIT 1",
+            (content_hash, time.time())
+        ).fetchone()
+
+    def update(self, job_id: str, fields: Dict) -> bool:
+        """
+        Atualiza campos de um job (merge atômico)
+
+        Incrementa "version" a cada mudança (usado como ETag do /status).
+
+        Args:
+            job_id: ID do job
+            fields: Campos a sobrescrever (valor None remove o campo)
+
+        Returns:
+            True se o job existia
+        """
+        with self._conn() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET data = json_set("
+                " json_patch(data, ?), '$.version',"
+                " coalesce(json_extract(data, '$.version'), 0) + 1)"
+                " WHERE job_id = ? AND expires_at > ?",
+                (orjson.dumps(fields).decode(), job_id, time.time())
+            )
+        return cursor.rowcount > 0
@@ -2,10 +2,12 @@
 Modelos de dados para controle de jobs de processamento
 """
 
+from dataclasses import dataclass
 from enum import Enum
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
-from pydantic import BaseModel
+import orjson
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 
 
 class JobStatus(str, Enum):
@@ -17,19 +19,41 @@ class JobStatus(str, Enum):
     CANCELLED = "cancelled"      # Cancelado pelo usuário
 
 
-class JobMetadata(BaseModel):
-    """Metadados de um job"""
+@dataclass(slots=True, frozen=True)
+class JobMetadata:
+    """
+    Metadados de um job (modelo interno, imutável: atualizar via replace)
+    
+    Dataclass com slots em vez de BaseModel: o JobManager mantém milhares
+    destes em memória e os troca a cada página processada
+    """
     job_id: str
     filename: str
     file_path: str
     status: JobStatus
     created_at: datetime
-    started_at: Optional[datetime] = None
-    completed_at: Optional[datetime] = None
+    # Instantes em time.monotonic() (baratos de gravar; convertidos só ao serializar)
+    created_at_mono: float
+    started_at_mono: Optional[float] = None
+    completed_at_mono: Optional[float] = None
     total_pages: Optional[int] = None
     processed_pages: int = 0
     error_message: Optional[str] = None
     
+    def _mono_to_datetime(self, mono: Optional[float]) -> Optional[datetime]:
+        """Converte instante monotônico em datetime (relativo a created_at)"""
+        if mono is None:
+            return None
+        return self.created_at + timedelta(seconds=mono - self.created_at_mono)
+    
+    @property
+    def started_at(self) -> Optional[datetime]:
+        return self._mono_to_datetime(self.started_at_mono)
+    
+    @property
+    def completed_at(self) -> Optional[datetime]:
+        return self._mono_to_datetime(self.completed_at_mono)
+    
 
 class JobResult(BaseModel):
     """Resultado final de um job"""
@@ -45,6 +69,8 @@ class JobResult(BaseModel):
 
 class JobProgress(BaseModel):
     """Progresso de um job (para polling)"""
+    model_config = ConfigDict(use_enum_values=True)
+    
     job_id: str
     status: JobStatus
     progress_percent: float  # 0-100
@@ -52,3 +78,12 @@ class JobProgress(BaseModel):
     processed_pages: int = 0
     estimated_time_remaining: Optional[int] = None  # segundos
     message: str = ""
+    
+    # JSON já serializado (instâncias são cacheadas pelo JobManager)
+    _json: Optional[bytes] = PrivateAttr(default=None)
+    
+    def to_json_bytes(self) -> bytes:
+        """Serializa com orjson uma única vez por instância"""
+        if self._json is None:
+            self._json = orjson.dumps(self.model_dump(mode="json"))
+        return self._json
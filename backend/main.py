@@ -2,7 +2,7 @@
 API FastAPI para processamento de convênios bancários
 Recebe PDFs, processa com OCR e retorna dados extraídos
 
-REFATORADO: Suporta PDFs grandes com ProcessPoolExecutor e cache
+REFATORADO: Suporta PDFs grandes com ProcessPoolExecutor e estado em SQLite
 """
 
 import os
@@ -12,20 +12,28 @@ import asyncio
 import logging
 from datetime import datetime
 from typing import List, Dict, Optional
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse
+import aiofiles
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
-from cachetools import TTLCache
 
-from services.ocr_service import OCRService
+from jobs.job_store import JobStore
+from services.ocr_service import OCRService, OCR_CONCURRENCY
 from services.page_filter import PageFilter
 from services.extractor import DataExtractor
 from services.excel_export import ExcelExporter
 
+try:
+    from blake3 import blake3 as content_hasher
+except ImportError:  # blake3 é opcional: sem ele, usa blake2b da stdlib
+    from hashlib import blake2b as content_hasher
+
 # Configuração de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,7 +46,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="API de Processamento de Convênios Bancários",
     description="API para processar PDFs de convênios bancários usando OCR",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # orjson para payloads grandes (items)
 )
 
 # Configura CORS
@@ -50,15 +59,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ProcessPoolExecutor global (máx 2 workers para não sobrecarregar CPU)
-executor = ProcessPoolExecutor(max_workers=2)
+class GZipExceptExports:
+    """
+    GZip para as respostas JSON, exceto /export
+    
+    O xlsx já é um zip: recomprimir só gasta CPU e impede o servidor de
+    enviar o corpo sem cópias extras
+    """
+    
+    def __init__(self, app, minimum_size: int = 1000):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/export/"):
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+
+# Comprime respostas JSON grandes (/result com muitas movimentações)
+app.add_middleware(GZipExceptExports, minimum_size=1000)
+
+# Serviços de cada processo do pool (criados uma vez, reaproveitados entre jobs)
+_OCR_SERVICE = None
+_CONVENIO_EXTRACTOR = None
 
-# Cache com TTL (expira em 1 hora)
-processing_cache = TTLCache(maxsize=100, ttl=3600)
 
-# Lock para acesso thread-safe ao cache
-import threading
-cache_lock = threading.Lock()
+def _create_ocr_service():
+    """
+    Cria serviço de OCR: Google Vision (mais preciso) ou fallback para Tesseract
+    
+    Returns:
+        GoogleVisionOCR ou OCRService
+    """
+    credentials_path = "credentials/google-vision-credentials.json"
+    
+    if os.path.exists(credentials_path) or 'GOOGLE_APPLICATION_CREDENTIALS' in os.environ:
+        try:
+            from services.google_vision_ocr import GoogleVisionOCR
+            ocr_service = GoogleVisionOCR(
+                credentials_path=credentials_path if os.path.exists(credentials_path) else None,
+                batch_size=5,
+                dpi=300
+            )
+            logger.info("✅ Usando Google Vision API (OCR profissional)")
+            return ocr_service
+        except Exception as e:
+            logger.warning(f"⚠️ Google Vision falhou: {e}. Usando Tesseract...")
+    
+    # Fallback para Tesseract
+    logger.info("ℹ️ Usando Tesseract OCR (pode ter baixa precisão)")
+    return OCRService(dpi=400, batch_size=5)
+
+
+def _init_worker():
+    """
+    Initializer do ProcessPoolExecutor: carrega serviços uma vez por processo
+    
+    Evita recriar cliente do Google Vision/Tesseract e extratores a cada job
+    """
+    global _OCR_SERVICE, _CONVENIO_EXTRACTOR
+    from services.safe_convenio_extractor import SafeConvenioExtractor
+    
+    _OCR_SERVICE = _create_ocr_service()
+    _CONVENIO_EXTRACTOR = SafeConvenioExtractor()  # Extrator SEGURO baseado em rótulos
+
+
+# Jobs simultâneos: cada job do Tesseract já usa OCR_CONCURRENCY processos
+# por página, então o padrão divide os núcleos para não sobrecarregar a CPU
+POOL_WORKERS = int(os.getenv("POOL_WORKERS", max(1, (os.cpu_count() or 2) // OCR_CONCURRENCY)))
+
+# ProcessPoolExecutor global (POOL_WORKERS jobs em paralelo)
+executor = ProcessPoolExecutor(max_workers=POOL_WORKERS, initializer=_init_worker)
+
+# Estado dos jobs em SQLite (TTL de 1 hora, compartilhado entre workers)
+job_store = JobStore()
 
 # Diretórios
 UPLOAD_DIR = Path("storage/uploads")
@@ -66,6 +142,18 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 # Configurações
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB por leitura/escrita
+
+# Long-polling do /status (?wait=N segundos)
+STATUS_MAX_WAIT = 30.0
+# O progresso por página é gravado pelos processos do pool, que não
+# acordam o event loop: relê o SQLite com este intervalo durante a espera
+STATUS_RECHECK_INTERVAL = 1.0
+STATUS_FIELDS = ("status", "records_found", "error", "version", "pages_done", "total_pages")
+
+# Eventos por job, sinalizados (no event loop) quando o job termina
+job_events: Dict[str, asyncio.Event] = {}
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
 
 
 class ProcessingResponse(BaseModel):
@@ -125,42 +213,42 @@ def process_pdf_worker(job_id: str, pdf_path: str) -> Dict:
     try:
         logger.info(f"[{job_id}] Worker iniciado")
         
-        # Instancia serviços (cada processo tem suas próprias instâncias)
-        from services.safe_convenio_extractor import SafeConvenioExtractor
-        import os
-        
-        # Tenta usar Google Vision API (mais preciso) ou fallback para Tesseract
-        ocr_service = None
-        credentials_path = "credentials/google-vision-credentials.json"
-        
-        if os.path.exists(credentials_path) or 'GOOGLE_APPLICATION_CREDENTIALS' in os.environ:
-            try:
-                from services.google_vision_ocr import GoogleVisionOCR
-                ocr_service = GoogleVisionOCR(
-                    credentials_path=credentials_path if os.path.exists(credentials_path) else None,
-                    batch_size=5,
-                    dpi=300
-                )
-                logger.info(f"[{job_id}] ✅ Usando Google Vision API (OCR profissional)")
-            except Exception as e:
-                logger.warning(f"[{job_id}] ⚠️ Google Vision falhou: {e}. Usando Tesseract...")
-                ocr_service = None
-        
-        # Fallback para Tesseract
-        if ocr_service is None:
-            from services.ocr_service import OCRService
-            ocr_service = OCRService(dpi=400, batch_size=5)
-            logger.info(f"[{job_id}] ℹ️ Usando Tesseract OCR (pode ter baixa precisão)")
-        
-        convenio_extractor = SafeConvenioExtractor()  # Extrator SEGURO baseado em rótulos
-        
-        # Processa em batches
-        logger.info(f"[{job_id}] Processando PDF em batches...")
+        from services.ocr_pipeline import OCRPipeline
+        
+        # Serviços pré-carregados pelo initializer do pool
+        if _OCR_SERVICE is None:
+            _init_worker()
+        ocr_service = _OCR_SERVICE
+        convenio_extractor = _CONVENIO_EXTRACTOR
+        
         all_ocr_results = []
+        paginas_extraidas = None
         
-        for batch_results in ocr_service.process_pdf_in_batches(pdf_path):
-            all_ocr_results.extend(batch_results)
-            logger.info(f"[{job_id}] Batch processado, total: {len(all_ocr_results)} páginas")
+        def report_progress(pages_done: int, total_pages: int):
+            # Grava direto no SQLite compartilhado (lido pelo GET /status)
+            job_store.update(job_id, {"pages_done": pages_done, "total_pages": total_pages})
+        
+        if isinstance(ocr_service, OCRService):
+            # Tesseract é CPU-bound: páginas em paralelo (OCR_CONCURRENCY processos)
+            logger.info(f"[{job_id}] Processando páginas em paralelo...")
+            all_ocr_results = ocr_service.process_pdf_parallel(pdf_path, progress_callback=report_progress)
+        else:
+            # OCR remoto: renderização, OCR e extração sobrepostos no pipeline
+            logger.info(f"[{job_id}] Processando PDF em pipeline...")
+            pipeline = OCRPipeline(
+                ocr_service,
+                extract_page=lambda ocr_result: convenio_extractor.extract_from_page(ocr_result, job_id),
+                progress_callback=report_progress,
+                ocr_workers=ocr_service.max_concurrency  # Vision espera rede: páginas em paralelo
+            )
+            all_ocr_results, paginas_extraidas = pipeline.run(pdf_path)
+        
+        # OCR terminou: o PDF não é mais lido, libera o disco já
+        # (antes da extração; o callback só remove se ainda existir)
+        try:
+            os.unlink(pdf_path)
+        except OSError as e:
+            logger.warning(f"[{job_id}] Não foi possível remover PDF: {e}")
         
         total_pages = len(all_ocr_results)
         
@@ -175,7 +263,8 @@ def process_pdf_worker(job_id: str, pdf_path: str) -> Dict:
         
         convenio_data = convenio_extractor.extract_convenio_data_from_pages(
             ocr_results=all_ocr_results,
-            documento_id=job_id
+            documento_id=job_id,
+            paginas_extraidas=paginas_extraidas
         )
         
         movimentacoes = convenio_data.get("movimentacoes", [])
@@ -206,7 +295,7 @@ def process_pdf_worker(job_id: str, pdf_path: str) -> Dict:
 
 
 @app.post("/upload", response_model=Dict)
-async def upload_pdf(file: UploadFile = File(...), background_tasks: BackgroundTasks = None):
+async def upload_pdf(file: UploadFile = File(...)):
     """
     Upload de PDF e início de processamento em background
     
@@ -225,42 +314,64 @@ async def upload_pdf(file: UploadFile = File(...), background_tasks: BackgroundT
         if not file.filename.endswith('.pdf'):
             raise HTTPException(400, "Apenas arquivos PDF são aceitos")
         
-        # Validação 2: Magic bytes
-        content_start = await file.read(4)
-        if not content_start.startswith(b'%PDF'):
+        # Validação 2: Magic bytes (primeiro chunk deve começar com %PDF)
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk.startswith(b'%PDF'):
             raise HTTPException(400, "Arquivo não é um PDF válido")
         
-        # Validação 3: Tamanho com chunks
-        file.file.seek(0)
+        # Validação 3: Tamanho (segue do primeiro chunk, sem voltar ao início)
         size = 0
-        chunks = []
+        hasher = content_hasher()
         
-        while chunk := await file.read(8192):
-            size += len(chunk)
-            if size > MAX_FILE_SIZE:
-                raise HTTPException(413, f"Arquivo muito grande (máx {MAX_FILE_SIZE//1024//1024}MB)")
-            chunks.append(chunk)
-        
-        # Salva arquivo
+        # Grava direto no disco conforme lê (memória constante por upload)
+        # e calcula o hash na mesma passada
         file_path = UPLOAD_DIR / f"{job_id}.pdf"
-        with open(file_path, 'wb') as f:
-            for chunk in chunks:
-                f.write(chunk)
-        
-        # Registra job como pending
-        with cache_lock:
-            processing_cache[job_id] = {
-                "status": "pending",
-                "filename": file.filename,
-                "created_at": datetime.now().isoformat()
+        try:
+            async with aiofiles.open(file_path, 'wb') as f:
+                while chunk:
+                    size += len(chunk)
+                    if size > MAX_FILE_SIZE:
+                        raise HTTPException(413, f"Arquivo muito grande (máx {MAX_FILE_SIZE//1024//1024}MB)")
+                    hasher.update(chunk)
+                    await f.write(chunk)
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        except BaseException:
+            # Não deixa arquivo parcial para trás
+            file_path.unlink(missing_ok=True)
+            raise
+        
+        # Mesmo PDF já enviado (processado ou em andamento): reaproveita o job
+        content_hash = hasher.hexdigest()
+        existing = await asyncio.to_thread(job_store.find_by_hash, content_hash)
+        if existing:
+            file_path.unlink(missing_ok=True)
+            existing_id, existing_status = existing
+            logger.info(f"Upload duplicado: {file.filename} -> job {existing_id} ({existing_status})")
+            return {
+                "job_id": existing_id,
+                "status": existing_status,
+                "message": "PDF já enviado. Use GET /status/{job_id} para acompanhar."
             }
         
-        # Dispara processamento em background
-        if background_tasks:
-            background_tasks.add_task(process_in_background, job_id, str(file_path))
-        else:
-            # Fallback se BackgroundTasks não disponível
-            asyncio.create_task(process_in_background(job_id, str(file_path)))
+        # Registra job como pending
+        await asyncio.to_thread(job_store.create, job_id, {
+            "status": "pending",
+            "filename": file.filename,
+            "content_hash": content_hash,
+            "created_at": datetime.now().isoformat()
+        })
+        
+        # Marca como processing ANTES de submeter (o callback pode rodar logo)
+        await asyncio.to_thread(job_store.update, job_id, {
+            "status": "processing",
+            "started_at": datetime.now().isoformat()
+        })
+        
+        # Dispara processamento direto no ProcessPoolExecutor (NÃO BLOQUEIA);
+        # o callback grava o resultado quando o worker terminar
+        logger.info(f"[{job_id}] Submetendo para ProcessPoolExecutor")
+        future = executor.submit(process_pdf_worker, job_id, str(file_path))
+        future.add_done_callback(partial(_on_job_done, job_id, str(file_path)))
         
         logger.info(f"Upload concluído: {job_id} - {file.filename} ({size} bytes)")
         
@@ -277,47 +388,37 @@ async def upload_pdf(file: UploadFile = File(...), background_tasks: BackgroundT
         raise HTTPException(500, f"Erro ao processar upload: {str(e)}")
 
 
-async def process_in_background(job_id: str, pdf_path: str):
+def _on_job_done(job_id: str, pdf_path: str, future: Future):
     """
-    Executa worker em ProcessPoolExecutor de forma assíncrona
+    Callback do executor quando o worker termina
     
-    CRÍTICO: Usa run_in_executor para não bloquear event loop
+    Roda na thread interna do ProcessPoolExecutor (fora do event loop):
+    grava resultado/erro no job store e remove o PDF
     """
     try:
-        # Atualiza status para processing
-        with cache_lock:
-            if job_id in processing_cache:
-                processing_cache[job_id]["status"] = "processing"
-                processing_cache[job_id]["started_at"] = datetime.now().isoformat()
-        
-        logger.info(f"[{job_id}] Submetendo para ProcessPoolExecutor")
+        result = future.result()
         
-        # Executa em processo separado (NÃO BLOQUEIA)
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            executor,
-            process_pdf_worker,
-            job_id,
-            pdf_path
-        )
-        
-        # Atualiza cache com resultado
-        with cache_lock:
-            if job_id in processing_cache:
-                processing_cache[job_id].update(result)
-                processing_cache[job_id]["completed_at"] = datetime.now().isoformat()
+        # Grava resultado
+        job_store.update(job_id, {
+            **result,
+            "completed_at": datetime.now().isoformat()
+        })
         
         logger.info(f"[{job_id}] Processamento concluído")
         
     except Exception as e:
-        logger.exception(f"[{job_id}] Erro no background task")
-        with cache_lock:
-            if job_id in processing_cache:
-                processing_cache[job_id]["status"] = "error"
-                processing_cache[job_id]["error"] = str(e)
+        logger.exception(f"[{job_id}] Erro no worker")
+        job_store.update(job_id, {
+            "status": "error",
+            "error": str(e)
+        })
     
     finally:
-        # Limpa arquivo após processamento
+        # Acorda quem está em long-polling no /status deste job
+        if _event_loop is not None:
+            _event_loop.call_soon_threadsafe(_notify_job_changed, job_id)
+        
+        # Garante limpeza se o worker falhou antes de remover o PDF
         try:
             if os.path.exists(pdf_path):
                 os.unlink(pdf_path)
@@ -326,38 +427,101 @@ async def process_in_background(job_id: str, pdf_path: str):
             logger.error(f"[{job_id}] Erro ao remover arquivo: {e}")
 
 
+def _notify_job_changed(job_id: str):
+    """Sinaliza o evento do job (roda no event loop); a próxima espera cria outro"""
+    event = job_events.pop(job_id, None)
+    if event is not None:
+        event.set()
+
+
+async def _wait_for_status_change(job_id: str, etag: str, wait: float) -> Optional[Dict]:
+    """
+    Espera o job mudar (ETag diferente) por até wait segundos
+    
+    Args:
+        job_id: ID do job
+        etag: ETag que o cliente já tem
+        wait: Tempo máximo de espera em segundos
+        
+    Returns:
+        Campos de status mais recentes (ou None se o job expirou)
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    
+    while True:
+        remaining = max(deadline - loop.time(), 0)
+        event = job_events.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=min(remaining, STATUS_RECHECK_INTERVAL))
+        except asyncio.TimeoutError:
+            pass
+        
+        job_data = await asyncio.to_thread(job_store.get_fields, job_id, *STATUS_FIELDS)
+        if not job_data or _status_etag(job_id, job_data) != etag or loop.time() >= deadline:
+            return job_data
+
+
+def _status_etag(job_id: str, job_data: Dict) -> str:
+    """ETag do /status: muda a cada update() do job"""
+    return f'"{job_id}-{job_data["version"] or 0}"'
+
+
 @app.get("/status/{job_id}", response_model=JobStatus)
-async def get_status(job_id: str):
+async def get_status(job_id: str, request: Request, response: Response, wait: float = 0):
     """
     Retorna status atual do job (para polling)
     
+    Suporta GET condicional: com If-None-Match igual ao ETag atual,
+    responde 304 sem corpo (job não mudou desde o último polling).
+    Com ?wait=N (long-polling), segura a resposta até o job mudar ou
+    passarem N segundos (máx STATUS_MAX_WAIT)
+    
     Args:
         job_id: ID do job
+        wait: Segundos para aguardar uma mudança antes de responder 304
         
     Returns:
         Status e progresso
     """
-    with cache_lock:
-        job_data = processing_cache.get(job_id)
+    # Só os campos do status: leitura pequena, sem lock e sem carregar "items"
+    job_data = await asyncio.to_thread(job_store.get_fields, job_id, *STATUS_FIELDS)
     
     if not job_data:
         raise HTTPException(404, "Job não encontrado")
     
-    status = job_data.get("status", "unknown")
+    etag = _status_etag(job_id, job_data)
+    if_none_match = request.headers.get("if-none-match")
     
-    # Calcula progresso (simplificado)
+    # Long-polling: só espera se o cliente já tem o estado atual e o job ainda pode mudar
+    if wait > 0 and if_none_match == etag and job_data["status"] in ("pending", "processing"):
+        job_data = await _wait_for_status_change(job_id, etag, min(wait, STATUS_MAX_WAIT))
+        if not job_data:
+            raise HTTPException(404, "Job não encontrado")
+        etag = _status_etag(job_id, job_data)
+    
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    
+    status = job_data["status"] or "unknown"
+    
+    # Progresso real por página (gravado pelo worker a cada página pronta)
+    pages_done = job_data["pages_done"] or 0
+    total_pages = job_data["total_pages"] or 0
     progress_map = {
         "pending": 0.0,
-        "processing": 50.0,
+        "processing": round(100 * pages_done / total_pages, 2) if total_pages else 0.0,
         "done": 100.0,
         "error": 0.0
     }
     
     message_map = {
         "pending": "Aguardando processamento",
-        "processing": "Processando PDF...",
-        "done": f"Concluído - {job_data.get('records_found', 0)} registros encontrados",
-        "error": f"Erro: {job_data.get('error', 'Desconhecido')}"
+        "processing": f"Processando página {pages_done}/{total_pages}" if total_pages else "Processando PDF...",
+        "done": f"Concluído - {job_data['records_found'] or 0} registros encontrados",
+        "error": f"Erro: {job_data['error'] or 'Desconhecido'}"
     }
     
     return JobStatus(
@@ -379,8 +543,7 @@ async def get_result(job_id: str):
     Returns:
         Dados extraídos (apenas se status = done)
     """
-    with cache_lock:
-        job_data = processing_cache.get(job_id)
+    job_data = await asyncio.to_thread(job_store.get, job_id)
     
     if not job_data:
         raise HTTPException(404, "Job não encontrado")
@@ -416,8 +579,7 @@ async def export_to_excel(job_id: str):
     Returns:
         Arquivo Excel para download
     """
-    with cache_lock:
-        job_data = processing_cache.get(job_id)
+    job_data = await asyncio.to_thread(job_store.get, job_id)
     
     if not job_data or job_data.get("status") != "done":
         raise HTTPException(404, "Resultado não disponível")
@@ -428,13 +590,15 @@ async def export_to_excel(job_id: str):
         raise HTTPException(404, "Nenhum dado para exportar")
     
     try:
+        # Geração do Excel é bloqueante: roda fora do event loop.
+        # Gera em memória e responde direto (sem gravar/reler arquivo temporário)
         excel_exporter = ExcelExporter()
-        excel_path = excel_exporter.export_to_file(data)
+        content = await asyncio.to_thread(excel_exporter.export_to_bytes, data)
         
-        return FileResponse(
-            excel_path,
+        return Response(
+            content=content,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            filename=f"convenio_{job_id}.xlsx"
+            headers={"Content-Disposition": f'attachment; filename="convenio_{job_id}.xlsx"'}
         )
     except Exception as e:
         logger.exception(f"Erro ao exportar: {e}")
@@ -444,9 +608,12 @@ async def export_to_excel(job_id: str):
 @app.on_event("startup")
 async def startup():
     """Inicialização da API"""
+    global _event_loop
+    _event_loop = asyncio.get_running_loop()
+    
     logger.info("=== API Iniciada ===")
     logger.info(f"ProcessPoolExecutor: {executor._max_workers} workers")
-    logger.info(f"Cache TTL: 3600s (1 hora)")
+    logger.info(f"Job store: {job_store.db_path} (TTL {job_store.ttl}s)")
     logger.info(f"Upload dir: {UPLOAD_DIR}")
 
 
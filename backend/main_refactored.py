@@ -4,7 +4,9 @@ Separação: Upload → Processamento Background → Polling
 """
 
 import os
+import multiprocessing
 import tempfile
+import threading
 import uuid
 import asyncio
 import logging
@@ -12,15 +14,17 @@ from pathlib import Path
 from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+import aiofiles
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
-from jobs.job_manager import job_manager
+from jobs.job_manager import job_manager, FINAL_STATUSES
 from jobs.models import JobStatus, JobProgress, JobResult
 from services.excel_export import ExcelExporter
-from workers.ocr_worker import process_ocr_job
+from services.ocr_service import OCR_CONCURRENCY
+from workers.ocr_worker import process_ocr_job, init_worker, update_job_progress
 
 # Configuração de logging
 logging.basicConfig(
@@ -33,7 +37,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="API de Processamento de Convênios Bancários",
     description="API assíncrona para OCR de PDFs com até 900 páginas",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse  # orjson para payloads grandes (items)
 )
 
 # CORS (configurar para domínios específicos em produção)
@@ -45,8 +50,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ProcessPoolExecutor global (máx 2 processos para não sobrecarregar)
-executor = ProcessPoolExecutor(max_workers=2)
+# Jobs simultâneos: cada job já faz o OCR de até OCR_CONCURRENCY páginas em
+# paralelo, então o padrão divide os núcleos para não sobrecarregar a CPU
+POOL_WORKERS = int(os.getenv("POOL_WORKERS", max(1, (os.cpu_count() or 2) // OCR_CONCURRENCY)))
+
+# Progresso dos jobs: workers -> processo principal (JobManager.consume_progress)
+progress_queue = multiprocessing.Queue()
+
+# ProcessPoolExecutor global (POOL_WORKERS processos, serviços carregados
+# uma vez por processo)
+executor = ProcessPoolExecutor(
+    max_workers=POOL_WORKERS,
+    initializer=init_worker,
+    initargs=(progress_queue,)
+)
 
 # Diretórios de armazenamento
 UPLOAD_DIR = Path("storage/uploads")
@@ -56,6 +73,8 @@ RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
 # Configurações
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB por leitura/escrita
+STATUS_MAX_WAIT = 30.0  # Long-polling do /status (?wait=N segundos)
 MAX_PAGES = 900
 
 
@@ -104,27 +123,28 @@ async def upload_pdf(file: UploadFile = File(...)):
         if not file.filename.endswith('.pdf'):
             raise HTTPException(400, "Apenas arquivos PDF são aceitos")
         
-        # Validação 2: Magic bytes (primeiros 4 bytes devem ser %PDF)
-        content_start = await file.read(4)
-        if not content_start.startswith(b'%PDF'):
+        # Validação 2: Magic bytes (primeiro chunk deve começar com %PDF)
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk.startswith(b'%PDF'):
             raise HTTPException(400, "Arquivo não é um PDF válido")
         
-        # Validação 3: Tamanho (lê em chunks para não estourar RAM)
-        file.file.seek(0)  # Volta ao início
+        # Validação 3: Tamanho (segue do primeiro chunk, sem voltar ao início)
         size = 0
-        chunks = []
         
-        while chunk := await file.read(8192):  # 8KB por chunk
-            size += len(chunk)
-            if size > MAX_FILE_SIZE:
-                raise HTTPException(413, f"Arquivo muito grande (máx {MAX_FILE_SIZE//1024//1024}MB)")
-            chunks.append(chunk)
-        
-        # Salva arquivo
+        # Grava direto no disco conforme lê (memória constante por upload)
         file_path = UPLOAD_DIR / f"{job_id}.pdf"
-        with open(file_path, 'wb') as f:
-            for chunk in chunks:
-                f.write(chunk)
+        try:
+            async with aiofiles.open(file_path, 'wb') as f:
+                while chunk:
+                    size += len(chunk)
+                    if size > MAX_FILE_SIZE:
+                        raise HTTPException(413, f"Arquivo muito grande (máx {MAX_FILE_SIZE//1024//1024}MB)")
+                    await f.write(chunk)
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        except BaseException:
+            # Não deixa arquivo parcial para trás
+            file_path.unlink(missing_ok=True)
+            raise
         
         # Cria job em estado PENDING
         job_manager.create_job(
@@ -182,20 +202,94 @@ async def process_pdf(job_id: str, background_tasks: BackgroundTasks):
 
 
 @app.get("/status/{job_id}", response_model=JobProgress)
-async def get_status(job_id: str):
+async def get_status(job_id: str, request: Request, wait: float = 0):
     """
     ETAPA 3: Polling de status
     
-    Cliente deve chamar a cada 2-5 segundos
+    Cliente deve chamar a cada 2-5 segundos. Com If-None-Match igual
+    ao ETag atual, responde 304 sem corpo (nada mudou). Com ?wait=N
+    (long-polling), segura a resposta até o job mudar ou passarem N
+    segundos (máx STATUS_MAX_WAIT), dispensando o intervalo entre polls
     """
     progress = job_manager.get_progress(job_id)
     
     if not progress:
         raise HTTPException(404, "Job não encontrado")
     
+    etag = _status_etag(job_id, progress)
+    if_none_match = request.headers.get("if-none-match")
+    
+    # Long-polling: só espera se o cliente já tem o estado atual e o job ainda pode mudar
+    if wait > 0 and if_none_match == etag and progress.status not in FINAL_STATUSES:
+        progress = await _wait_for_status_change(job_id, progress, min(wait, STATUS_MAX_WAIT))
+        etag = _status_etag(job_id, progress)
+    
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    
+    # Bytes prontos (cacheados): evita revalidar o response_model a cada polling
+    return Response(content=progress.to_json_bytes(), media_type="application/json", headers=headers)
+
+
+def _status_etag(job_id: str, progress: JobProgress) -> str:
+    """ETag do /status: status + páginas processadas determinam todo o progresso"""
+    return f'"{job_id}-{progress.status}-{progress.processed_pages}"'
+
+
+async def _wait_for_status_change(job_id: str, progress: JobProgress, wait: float) -> JobProgress:
+    """
+    Espera o progresso do job mudar por até wait segundos
+    
+    Usa o mesmo stream push do WebSocket (job_manager.subscribe)
+    
+    Args:
+        job_id: ID do job
+        progress: Progresso que o cliente já tem
+        wait: Tempo máximo de espera em segundos
+        
+    Returns:
+        Progresso mais recente (o mesmo, se nada mudou no prazo)
+    """
+    etag = _status_etag(job_id, progress)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    updates = job_manager.subscribe(job_id)
+    try:
+        while _status_etag(job_id, progress) == etag:
+            progress = await asyncio.wait_for(anext(updates), timeout=max(deadline - loop.time(), 0))
+    except (asyncio.TimeoutError, StopAsyncIteration):
+        pass
+    finally:
+        await updates.aclose()
+    
     return progress
 
 
+@app.websocket("/ws/status/{job_id}")
+async def status_websocket(websocket: WebSocket, job_id: str):
+    """
+    ETAPA 3 (alternativa): Progresso via WebSocket
+    
+    Envia o estado atual e uma mensagem a cada mudança, fechando a
+    conexão quando o job termina. Dispensa o polling de /status
+    """
+    await websocket.accept()
+    
+    if not job_manager.get_job(job_id):
+        await websocket.close(code=4404, reason="Job não encontrado")
+        return
+    
+    try:
+        async for progress in job_manager.subscribe(job_id):
+            await websocket.send_text(progress.to_json_bytes().decode())
+    except WebSocketDisconnect:
+        logger.info(f"[{job_id}] WebSocket desconectado pelo cliente")
+        return
+    
+    await websocket.close()
+
+
 @app.get("/result/{job_id}", response_model=JobResult)
 async def get_result(job_id: str):
     """
@@ -237,14 +331,22 @@ async def export_excel(job_id: str):
         raise HTTPException(404, "Resultado não disponível")
     
     try:
-        exporter = ExcelExporter()
-        excel_path = exporter.export_to_file(
-            result.items,
-            output_path=str(RESULTS_DIR / f"{job_id}.xlsx")
-        )
+        # Resultado DONE não muda: gera o Excel uma vez em RESULTS_DIR (mesmo
+        # disco do storage) e serve o arquivo direto, sem passar por memória
+        export_path = RESULTS_DIR / f"convenio_{job_id}.xlsx"
+        if not export_path.exists():
+            # Geração é bloqueante: roda fora do event loop. Grava num
+            # temporário único e renomeia (downloads simultâneos não se cruzam)
+            tmp_path = RESULTS_DIR / f".{job_id}-{uuid.uuid4().hex}.tmp"
+            exporter = ExcelExporter()
+            try:
+                await asyncio.to_thread(exporter.export_to_file, result.items, str(tmp_path))
+                os.replace(tmp_path, export_path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
         
         return FileResponse(
-            excel_path,
+            export_path,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             filename=f"convenio_{job_id}.xlsx"
         )
@@ -282,13 +384,13 @@ async def run_ocr_in_background(job_id: str, pdf_path: str):
         logger.info(f"[{job_id}] Submetendo para ProcessPoolExecutor")
         
         # Executa em processo separado (não bloqueia FastAPI)
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
         result = await loop.run_in_executor(
             executor,
             process_ocr_job,
             job_id,
             pdf_path,
-            None  # callback (limitação: não funciona entre processos)
+            update_job_progress  # Progresso volta pela progress_queue
         )
         
         # Atualiza resultado
@@ -302,6 +404,14 @@ async def run_ocr_in_background(job_id: str, pdf_path: str):
         job_manager.fail_job(job_id, str(e))
 
 
+def _remove_export(job_id: str):
+    """Apaga o Excel em cache de um job descartado pelo JobManager"""
+    (RESULTS_DIR / f"convenio_{job_id}.xlsx").unlink(missing_ok=True)
+
+
+job_manager.on_job_removed(_remove_export)
+
+
 # === LIFECYCLE ===
 
 @app.on_event("startup")
@@ -309,6 +419,18 @@ async def startup():
     """Inicialização"""
     logger.info("API iniciada")
     logger.info(f"ProcessPoolExecutor: {executor._max_workers} workers")
+    
+    # Aplica o progresso enviado pelos workers
+    threading.Thread(
+        target=job_manager.consume_progress,
+        args=(progress_queue,),
+        name="job-progress",
+        daemon=True
+    ).start()
+    
+    # Jobs ficam só em memória: exports de execuções anteriores são órfãos
+    for stale in RESULTS_DIR.glob("convenio_*.xlsx"):
+        stale.unlink(missing_ok=True)
 
 
 @app.on_event("shutdown")
@@ -316,6 +438,7 @@ async def shutdown():
     """Limpeza ao desligar"""
     logger.info("Encerrando ProcessPoolExecutor...")
     executor.shutdown(wait=True)
+    progress_queue.put(None)  # Encerra o consumo de progresso
     logger.info("API encerrada")
 
 
@@ -6,10 +6,12 @@ Gera arquivo .xlsx com dados estruturados
 import os
 import tempfile
 from datetime import datetime
-from typing import List, Dict
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils import get_column_letter
+from io import BytesIO
+from typing import List, Dict, Union
+import xlsxwriter
+
+# Troca separadores em uma passada: 1,234.56 -> 1.234,56 (padrão brasileiro)
+_BRL_SEPARATORS = str.maketrans(",.", ".,")
 
 
 class ExcelExporter:
@@ -40,80 +42,88 @@ class ExcelExporter:
             return "-"
         
         if isinstance(value, float):
-            return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+            return f"R$ {value:,.2f}".translate(_BRL_SEPARATORS)
         
         return str(value)
     
-    def create_workbook(self, data: List[Dict[str, any]]) -> Workbook:
+    def write_workbook(self, data: List[Dict[str, any]], target: Union[str, BytesIO]):
         """
-        Cria workbook Excel com dados
+        Escreve workbook Excel com dados
+        
+        Usa xlsxwriter: linhas vão direto para o disco conforme são
+        escritas (constant_memory), sem objeto Cell por célula.
         
         Args:
             data: Lista de dicionários com dados extraídos
-            
-        Returns:
-            Workbook do openpyxl
+            target: Caminho do arquivo ou BytesIO
         """
-        # Cria novo workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Convênios Bancários"
-        
-        # Estilo do cabeçalho
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Adiciona cabeçalhos
-        for col_num, header in enumerate(self.column_headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = header_alignment
-        
-        # Mapeia campos do dicionário para colunas
-        field_mapping = {
-            "Banco": "banco",
-            "Agência": "agencia",
-            "Conta": "conta",
-            "Tipo de Conta": "tipo_conta",
-            "CPF/CNPJ": "cpf_cnpj",
-            "Valor (R$)": "valor"
-        }
-        
-        # Adiciona dados
-        for row_num, record in enumerate(data, start=2):
-            for col_num, header in enumerate(self.column_headers, 1):
-                field_name = field_mapping[header]
-                value = record.get(field_name)
-                formatted_value = self.format_value(value)
-                
-                cell = ws.cell(row=row_num, column=col_num, value=formatted_value)
-                cell.alignment = Alignment(horizontal="left", vertical="center")
-        
-        # Ajusta largura das colunas
-        column_widths = {
-            "A": 25,  # Banco
-            "B": 12,  # Agência
-            "C": 15,  # Conta
-            "D": 15,  # Tipo de Conta
-            "E": 18,  # CPF/CNPJ
-            "F": 15   # Valor
-        }
-        
-        for col_letter, width in column_widths.items():
-            ws.column_dimensions[col_letter].width = width
-        
-        # Adiciona linha de total se houver valores
-        if any(record.get("valor") for record in data):
-            total_row = len(data) + 3
-            ws.cell(row=total_row, column=5, value="TOTAL:").font = Font(bold=True)
+        options = {'default_date_format': 'yyyy-mm-dd'}
+        if isinstance(target, BytesIO):
+            options['in_memory'] = True
+        else:
+            options['constant_memory'] = True
+        
+        with xlsxwriter.Workbook(target, options) as wb:
+            ws = wb.add_worksheet("Convênios Bancários")
             
-            total_value = sum(record.get("valor", 0) or 0 for record in data)
-            ws.cell(row=total_row, column=6, value=self.format_value(total_value))
-            ws.cell(row=total_row, column=6).font = Font(bold=True)
-        
-        return wb
+            # Estilos
+            header_format = wb.add_format({
+                'bold': True,
+                'font_color': '#FFFFFF',
+                'font_size': 11,
+                'bg_color': '#366092',
+                'align': 'center',
+                'valign': 'vcenter'
+            })
+            cell_format = wb.add_format({'align': 'left', 'valign': 'vcenter'})
+            bold_format = wb.add_format({'bold': True})
+            
+            # Ajusta largura das colunas
+            column_widths = [
+                25,  # Banco
+                12,  # Agência
+                15,  # Conta
+                15,  # Tipo de Conta
+                18,  # CPF/CNPJ
+                15   # Valor
+            ]
+            for col_num, width in enumerate(column_widths):
+                ws.set_column(col_num, col_num, width)
+            
+            # Adiciona cabeçalhos
+            ws.write_row(0, 0, self.column_headers, header_format)
+            
+            # Mapeia campos do dicionário para colunas (na ordem dos cabeçalhos)
+            field_mapping = {
+                "Banco": "banco",
+                "Agência": "agencia",
+                "Conta": "conta",
+                "Tipo de Conta": "tipo_conta",
+                "CPF/CNPJ": "cpf_cnpj",
+                "Valor (R$)": "valor"
+            }
+            fields = [field_mapping[header] for header in self.column_headers]
+            
+            # Adiciona dados e acumula total na mesma passada
+            format_value = self.format_value
+            tem_valor = False
+            total_value = 0
+            for row_num, record in enumerate(data, start=1):
+                ws.write_row(
+                    row_num, 0,
+                    [format_value(record.get(field)) for field in fields],
+                    cell_format
+                )
+                valor = record.get("valor")
+                if valor:
+                    tem_valor = True
+                    total_value += valor
+            
+            # Adiciona linha de total se houver valores
+            if tem_valor:
+                total_row = len(data) + 2
+                ws.write(total_row, 4, "TOTAL:", bold_format)
+                ws.write(total_row, 5, self.format_value(total_value), bold_format)
     
     def export_to_file(self, data: List[Dict[str, any]], output_path: str = None) -> str:
         """
@@ -129,9 +139,6 @@ class ExcelExporter:
         if not data:
             raise ValueError("Nenhum dado para exportar")
         
-        # Cria workbook
-        wb = self.create_workbook(data)
-        
         # Define caminho do arquivo
         if not output_path:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -140,8 +147,8 @@ class ExcelExporter:
                 f"convenio_bancario_{timestamp}.xlsx"
             )
         
-        # Salva arquivo
-        wb.save(output_path)
+        # Escreve arquivo
+        self.write_workbook(data, output_path)
         
         return output_path
     
@@ -158,13 +165,8 @@ class ExcelExporter:
         if not data:
             raise ValueError("Nenhum dado para exportar")
         
-        # Cria workbook
-        wb = self.create_workbook(data)
-        
-        # Salva em bytes
-        from io import BytesIO
+        # Escreve em memória
         output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+        self.write_workbook(data, output)
         
         return output.getvalue()
@@ -4,7 +4,21 @@ Usa regex para identificar informações estruturadas
 """
 
 import re
-from typing import List, Dict, Optional
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Dict, Optional
+
+# Textos com resultado de extract_all em cache (capas, páginas em branco e
+# cabeçalhos repetidos não passam de novo pelas regex)
+EXTRACT_CACHE_SIZE = 2048
+
+# CNPJ (14 dígitos) ou CPF (11 dígitos), com ou sem pontuação, numa regex só.
+# O lookahead testa cada posição (matches sobrepostos) e tenta CNPJ primeiro.
+# A pontuação possível no match é só ". / -": replace() encadeado tira os
+# três (mais rápido que re.sub ou str.translate em strings tão curtas)
+CPF_CNPJ_RE = re.compile(
+    r'(?=(?P<cnpj>\d{2}\.?\d{3}\.?\d{3}\/?\d{4}-?\d{2})|(?P<cpf>\d{3}\.?\d{3}\.?\d{3}-?\d{2}))'
+)
 
 
 class DataExtractor:
@@ -12,6 +26,11 @@ class DataExtractor:
     
     def __init__(self):
         """Inicializa o extrator de dados"""
+        # Cache LRU de extract_all (texto -> resultado). Com lock: extract_record
+        # roda em várias threads ao mesmo tempo
+        self._extract_cache: "OrderedDict[str, Dict[str, any]]" = OrderedDict()
+        self._extract_cache_lock = threading.Lock()
+        
         # Lista de bancos conhecidos
         self.banks = [
             "BANCO DO BRASIL", "BB", "BANCO BRASIL",
@@ -25,32 +44,82 @@ class DataExtractor:
             "SICREDI", "BANCO SICREDI",
             "SICOOB", "BANCO COOPERATIVO SICOOB"
         ]
+        
+        # Todos os bancos conhecidos numa única alternação (mais longos primeiro).
+        # O lookahead testa cada posição do texto, então ocorrências sobrepostas
+        # também aparecem: uma passada só em vez de um "in" por banco
+        banks_by_length = sorted(self.banks, key=len, reverse=True)
+        self._known_banks_re = re.compile(
+            '(?=(' + '|'.join(re.escape(bank.upper()) for bank in banks_by_length) + '))'
+        )
+        # Prioridade de cada match = posição na lista do primeiro banco contido
+        # nele (ex.: "BANCO SANTANDER" contém "SANTANDER", que vem antes)
+        self._bank_priority = {
+            bank.upper(): min(i for i, other in enumerate(self.banks) if other.upper() in bank.upper())
+            for bank in self.banks
+        }
+        
+        # Regex compiladas uma vez (evita o lookup no cache do re a cada chamada).
+        # Sem IGNORECASE: rodam sobre text.upper(), feito uma vez em extract_all
+        self._bank_res = [
+            re.compile(p) for p in (
+                r'BANCO\s+([A-ZÁÉÍÓÚÇ\s]+?)(?:\s|$|\.|,)',
+                r'INSTITUI[ÇC][AÃ]O\s+FINANCEIRA\s+([A-ZÁÉÍÓÚÇ\s]+?)(?:\s|$|\.|,)',
+            )
+        ]
+        
+        # Agência (geralmente 4 dígitos)
+        self._agency_res = [
+            re.compile(p) for p in (
+                r'AG[EÊ]NCIA[:\s]+(\d{4,5})',
+                r'AG[EÊ]NCIA[:\s]+(\d{1,2}\.\d{3})',
+                r'AG[:\s]+(\d{4,5})',
+                r'AG[:\s]+(\d{1,2}\.\d{3})',
+            )
+        ]
+        
+        # Conta (geralmente 5-10 dígitos, pode ter hífen)
+        self._account_res = [
+            re.compile(p) for p in (
+                r'CONTA[:\s]+(\d{5,10})',
+                r'CONTA[:\s]+(\d{1,5}[-\.]?\d{1,5})',
+                r'CONTA\s+CORRENTE[:\s]+(\d{5,10})',
+                r'CONTA\s+POUPAN[ÇC]A[:\s]+(\d{5,10})',
+                r'CC[:\s]+(\d{5,10})',
+            )
+        ]
+        
+        # Valores monetários numa regex só: "R$ 1.234,56" (grupo 1) ou
+        # "1.234,56 R$" (grupo 2). O "R$" depois do número fica num lookahead
+        # para não ser consumido e esconder um "R$ valor" logo em seguida.
+        # ("VALOR: R$ ..." já é coberto pelo grupo 1)
+        self._value_re = re.compile(
+            r'R\$\s*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)'
+            r'|(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)(?=\s*R\$)'
+        )
     
-    def extract_bank_name(self, text: str) -> Optional[str]:
+    def extract_bank_name(self, text: str, text_upper: Optional[str] = None) -> Optional[str]:
         """
         Extrai nome do banco do texto
         
         Args:
             text: Texto para análise
+            text_upper: text.upper() já calculado (evita outra cópia do texto)
             
         Returns:
             Nome do banco encontrado ou None
         """
-        text_upper = text.upper()
+        if text_upper is None:
+            text_upper = text.upper()
         
-        # Procura por nomes de bancos conhecidos
-        for bank in self.banks:
-            if bank.upper() in text_upper:
-                return bank
+        # Procura por nomes de bancos conhecidos (vence o primeiro da lista)
+        priorities = [self._bank_priority[m.group(1)] for m in self._known_banks_re.finditer(text_upper)]
+        if priorities:
+            return self.banks[min(priorities)]
         
         # Tenta padrões genéricos
-        patterns = [
-            r'BANCO\s+([A-ZÁÉÍÓÚÇ\s]+?)(?:\s|$|\.|,)',
-            r'INSTITUI[ÇC][AÃ]O\s+FINANCEIRA\s+([A-ZÁÉÍÓÚÇ\s]+?)(?:\s|$|\.|,)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text_upper, re.IGNORECASE)
+        for pattern in self._bank_res:
+            match = pattern.search(text_upper)
             if match:
                 bank_name = match.group(1).strip()
                 if len(bank_name) > 3:  # Filtra nomes muito curtos
@@ -58,26 +127,22 @@ class DataExtractor:
         
         return None
     
-    def extract_agency(self, text: str) -> Optional[str]:
+    def extract_agency(self, text: str, text_upper: Optional[str] = None) -> Optional[str]:
         """
         Extrai número da agência
         
         Args:
             text: Texto para análise
+            text_upper: text.upper() já calculado (evita outra cópia do texto)
             
         Returns:
             Número da agência ou None
         """
-        # Padrões para agência (geralmente 4 dígitos)
-        patterns = [
-            r'AG[EÊ]NCIA[:\s]+(\d{4,5})',
-            r'AG[EÊ]NCIA[:\s]+(\d{1,2}\.\d{3})',
-            r'AG[:\s]+(\d{4,5})',
-            r'AG[:\s]+(\d{1,2}\.\d{3})',
-        ]
+        if text_upper is None:
+            text_upper = text.upper()
         
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in self._agency_res:
+            match = pattern.search(text_upper)
             if match:
                 agency = match.group(1).replace('.', '').strip()
                 if len(agency) >= 4:
@@ -85,27 +150,22 @@ class DataExtractor:
         
         return None
     
-    def extract_account(self, text: str) -> Optional[str]:
+    def extract_account(self, text: str, text_upper: Optional[str] = None) -> Optional[str]:
         """
         Extrai número da conta
         
         Args:
             text: Texto para análise
+            text_upper: text.upper() já calculado (evita outra cópia do texto)
             
         Returns:
             Número da conta ou None
         """
-        # Padrões para conta (geralmente 5-10 dígitos, pode ter hífen)
-        patterns = [
-            r'CONTA[:\s]+(\d{5,10})',
-            r'CONTA[:\s]+(\d{1,5}[-\.]?\d{1,5})',
-            r'CONTA\s+CORRENTE[:\s]+(\d{5,10})',
-            r'CONTA\s+POUPAN[ÇC]A[:\s]+(\d{5,10})',
-            r'CC[:\s]+(\d{5,10})',
-        ]
+        if text_upper is None:
+            text_upper = text.upper()
         
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in self._account_res:
+            match = pattern.search(text_upper)
             if match:
                 account = match.group(1).replace('.', '').replace('-', '').strip()
                 if len(account) >= 5:
@@ -113,17 +173,23 @@ class DataExtractor:
         
         return None
     
-    def extract_account_type(self, text: str) -> Optional[str]:
+    def extract_account_type(self, text: str, text_upper: Optional[str] = None) -> Optional[str]:
         """
         Extrai tipo de conta
         
+        Busca por substring ("in"), não regex: cada "in" é uma busca
+        rápida em C e as 4 juntas saem ~5x mais rápidas que uma regex
+        com alternação testada em cada posição do texto
+        
         Args:
             text: Texto para análise
+            text_upper: text.upper() já calculado (evita outra cópia do texto)
             
         Returns:
             Tipo de conta (CORRENTE, POUPANÇA, etc.) ou None
         """
-        text_upper = text.upper()
+        if text_upper is None:
+            text_upper = text.upper()
         
         if 'POUPANÇA' in text_upper or 'POUPANCA' in text_upper:
             return 'POUPANÇA'
@@ -146,113 +212,147 @@ class DataExtractor:
         Returns:
             CPF ou CNPJ formatado ou None
         """
-        # Remove espaços e caracteres especiais para busca
-        clean_text = re.sub(r'[^\d]', '', text)
-        
-        # Padrão CNPJ (14 dígitos)
-        cnpj_pattern = r'(\d{2}\.?\d{3}\.?\d{3}\/?\d{4}-?\d{2})'
-        cnpj_match = re.search(cnpj_pattern, text)
-        if cnpj_match:
-            cnpj = re.sub(r'[^\d]', '', cnpj_match.group(1))
-            if len(cnpj) == 14:
+        # Uma passada: o primeiro CNPJ do texto tem prioridade;
+        # sem CNPJ, vale o primeiro CPF
+        first_cpf = None
+        for match in CPF_CNPJ_RE.finditer(text):
+            if match.group('cnpj'):
+                cnpj = match.group('cnpj').replace('.', '').replace('/', '').replace('-', '')
                 return f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+            if first_cpf is None:
+                first_cpf = match.group('cpf')
         
-        # Padrão CPF (11 dígitos)
-        cpf_pattern = r'(\d{3}\.?\d{3}\.?\d{3}-?\d{2})'
-        cpf_match = re.search(cpf_pattern, text)
-        if cpf_match:
-            cpf = re.sub(r'[^\d]', '', cpf_match.group(1))
-            if len(cpf) == 11:
-                return f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
+        if first_cpf:
+            cpf = first_cpf.replace('.', '').replace('-', '')
+            return f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
         
         return None
     
-    def extract_value(self, text: str) -> Optional[float]:
+    def extract_value(self, text: str, text_upper: Optional[str] = None) -> Optional[float]:
         """
         Extrai valores monetários
         
         Args:
             text: Texto para análise
+            text_upper: text.upper() já calculado (evita outra cópia do texto)
             
         Returns:
             Valor numérico ou None
         """
-        # Padrões para valores monetários
-        patterns = [
-            r'R\$\s*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)',
-            r'(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)\s*R\$',
-            r'VALOR[:\s]+R\$\s*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)',
-        ]
+        if text_upper is None:
+            text_upper = text.upper()
         
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
-                # Pega o maior valor encontrado (geralmente é o principal)
-                values = []
-                for match in matches:
-                    value_str = match.replace('.', '').replace(',', '.')
-                    try:
-                        values.append(float(value_str))
-                    except:
-                        pass
-                if values:
-                    return max(values)
+        # Pega o maior valor encontrado (geralmente é o principal).
+        # "R$ valor" tem prioridade: "valor R$" só conta se não houver nenhum
+        best_before = best_after = None
+        for match in self._value_re.finditer(text_upper):
+            value_str = match.group(1)
+            if value_str is not None:
+                value = float(value_str.replace('.', '').replace(',', '.'))
+                if best_before is None or value > best_before:
+                    best_before = value
+            elif best_before is None:
+                value = float(match.group(2).replace('.', '').replace(',', '.'))
+                if best_after is None or value > best_after:
+                    best_after = value
         
-        return None
+        return best_before if best_before is not None else best_after
     
     def extract_all(self, text: str) -> Dict[str, any]:
         """
         Extrai todas as informações bancárias do texto
         
+        Textos repetidos vêm do cache (até EXTRACT_CACHE_SIZE textos)
+        
         Args:
             text: Texto completo para análise
             
         Returns:
-            Dicionário com todos os dados extraídos
+            Dicionário com todos os dados extraídos (cópia: pode ser alterado)
         """
-        return {
-            "banco": self.extract_bank_name(text),
-            "agencia": self.extract_agency(text),
-            "conta": self.extract_account(text),
-            "tipo_conta": self.extract_account_type(text),
+        with self._extract_cache_lock:
+            cached = self._extract_cache.get(text)
+            if cached is not None:
+                self._extract_cache.move_to_end(text)
+                return dict(cached)
+        
+        # Maiúsculas uma vez só, compartilhadas por todos os extratores
+        text_upper = text.upper()
+        result = {
+            "banco": self.extract_bank_name(text, text_upper),
+            "agencia": self.extract_agency(text, text_upper),
+            "conta": self.extract_account(text, text_upper),
+            "tipo_conta": self.extract_account_type(text, text_upper),
             "cpf_cnpj": self.extract_cpf_cnpj(text),
-            "valor": self.extract_value(text)
+            "valor": self.extract_value(text, text_upper)
         }
+        
+        with self._extract_cache_lock:
+            self._extract_cache[text] = result
+            if len(self._extract_cache) > EXTRACT_CACHE_SIZE:
+                self._extract_cache.popitem(last=False)
+        
+        return dict(result)
     
-    def extract_multiple_records(self, pages_text: List[str]) -> List[Dict[str, any]]:
+    def extract_record(self, text: str) -> Optional[Dict[str, any]]:
         """
-        Extrai múltiplos registros de múltiplas páginas ou seções
+        Extrai o registro de um único texto (página/seção)
+        
+        Pode ser chamado em paralelo por várias threads: o único estado
+        compartilhado é o cache de extract_all, acessado sob
+        _extract_cache_lock.
         
         Args:
-            pages_text: Lista de textos de páginas relevantes
+            text: Texto de uma página relevante
             
         Returns:
-            Lista de dicionários com dados extraídos
+            Dicionário com dados extraídos ou None se não há banco nem agência/conta
         """
-        all_records = []
+        if not text or len(text.strip()) == 0:
+            return None
         
-        # Processa cada página/seção
-        for text in pages_text:
-            if not text or len(text.strip()) == 0:
-                continue
-            
-            # Extrai dados desta seção
-            record = self.extract_all(text)
-            
-            # Só adiciona se tiver pelo menos banco ou agência/conta
-            if record.get("banco") or (record.get("agencia") and record.get("conta")):
-                all_records.append(record)
+        record = self.extract_all(text)
+        
+        # Só aceita se tiver pelo menos banco ou agência/conta
+        if record.get("banco") or (record.get("agencia") and record.get("conta")):
+            return record
+        
+        return None
+    
+    def deduplicate_records(self, all_records: Iterable[Dict[str, any]]) -> List[Dict[str, any]]:
+        """
+        Remove duplicatas baseado em agência + conta
+        
+        Chave em tupla (sem formatar string); registros sem agência/conta
+        compartilham a chave (None, None) e ficam só no primeiro
         
-        # Remove duplicatas baseado em agência + conta
+        Args:
+            all_records: Registros na ordem das páginas (lista ou generator)
+            
+        Returns:
+            Registros únicos
+        """
         unique_records = []
         seen = set()
         
         for record in all_records:
-            key = f"{record.get('agencia', '')}_{record.get('conta', '')}"
-            if key and key not in seen:
+            key = (record.get('agencia'), record.get('conta'))
+            if key not in seen:
                 seen.add(key)
                 unique_records.append(record)
-            elif not key:  # Se não tem agência/conta, adiciona mesmo assim
-                unique_records.append(record)
         
-        return unique_records if unique_records else all_records
+        return unique_records
+    
+    def extract_multiple_records(self, pages_text: List[str]) -> List[Dict[str, any]]:
+        """
+        Extrai múltiplos registros de múltiplas páginas ou seções
+        
+        Args:
+            pages_text: Lista de textos de páginas relevantes
+            
+        Returns:
+            Lista de dicionários com dados extraídos
+        """
+        records = (self.extract_record(text) for text in pages_text)
+        # Generator até o fim: extração e deduplicação numa passada só
+        return self.deduplicate_records(record for record in records if record)
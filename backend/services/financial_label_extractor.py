@@ -12,12 +12,38 @@ DATA: 2026-01-20
 
 import re
 import logging
+from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
-from decimal import Decimal, InvalidOperation
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(slots=True)
+class ValorRotulado:
+    """
+    Valor financeiro encontrado junto de um rótulo válido
+    
+    Dataclass com slots em vez de dict: um extrato grande gera dezenas de
+    milhares destes, e sem __dict__ cada um ocupa bem menos memória
+    """
+    rotulo: str
+    campo: str
+    valor_texto: str
+    # None quando o valor é SUSPEITO (ilegível ou fora dos limites)
+    valor_decimal: Optional[float]
+    # Centavos inteiros: os totais somam inteiros (exatos), não floats.
+    # None também quando o valor tem mais de 2 casas (ex.: valor da cota):
+    # aí o campo é somado em float, sem arredondar para centavos
+    valor_centavos: Optional[int]
+    pagina: int
+    linha_original: str
+    status_validacao: str
+    posicao_match: Optional[int] = None
+    motivo: Optional[str] = None
+
+
 class FinancialLabelExtractor:
     """Extrator que APENAS considera valores com rótulos válidos"""
     
@@ -67,26 +93,47 @@ class FinancialLabelExtractor:
     
     def __init__(self):
         """Inicializa extrator baseado em rótulos"""
-        # Compila regex para cada rótulo
-        self.rotulo_patterns = {}
-        for rotulo, campo in self.ROTULOS_VALIDOS.items():
-            # Pattern: ROTULO seguido de valor numérico
-            # Exemplo: "SALDO ANTERIOR 168.376,96"
-            pattern = rf'\b{re.escape(rotulo)}\b\s*[\:\-]?\s*([0-9]+(?:\.[0-9]+)*(?:,[0-9]+)?)'
-            self.rotulo_patterns[rotulo] = {
-                'campo': campo,
-                'pattern': re.compile(pattern, re.IGNORECASE)
-            }
+        # Uma única regex com todos os rótulos (uma passada pelo texto).
+        # Cada alternativa é (ROTULO seguido de valor numérico (valor)):
+        # o grupo externo fecha por último, então match.lastindex
+        # identifica o rótulo e lastindex + 1 é o valor. Espaços sem
+        # quebra de linha ([^\S\n]): rótulo e valor na mesma linha
+        # Exemplo: "SALDO ANTERIOR 168.376,96"
+        alternativas = []
+        self.rotulo_por_grupo = {}
+        for i, rotulo in enumerate(sorted(self.ROTULOS_VALIDOS, key=len, reverse=True)):
+            alternativas.append(
+                rf'(\b{re.escape(rotulo)}\b[^\S\n]*[\:\-]?[^\S\n]*([0-9]+(?:\.[0-9]+)*(?:,[0-9]+)?))'
+            )
+            self.rotulo_por_grupo[2 * i + 1] = rotulo
+        # Lookaheads com a 1ª letra e as 2 primeiras letras dos rótulos: a
+        # regex só tenta as 25 alternativas onde uma delas pode começar
+        # (~25x mais rápido que testar todas em cada posição do texto).
+        # O conjunto de letras vem antes do \b para o motor pular direto
+        # as posições que não começam com nenhuma delas
+        iniciais = ''.join(sorted({re.escape(rotulo[0]) for rotulo in self.ROTULOS_VALIDOS}))
+        prefixos = '|'.join(sorted({re.escape(rotulo[:2]) for rotulo in self.ROTULOS_VALIDOS}))
+        self.rotulos_pattern = re.compile(
+            rf'(?=[{iniciais}])\b(?={prefixos})(?:' + '|'.join(alternativas) + ')',
+            re.IGNORECASE
+        )
+        
+        # Pré-filtro barato: 3 primeiras letras de cada rótulo. A maioria
+        # das linhas do OCR não tem nenhuma e dispensa a regex
+        self.prefixos_rotulos = tuple(sorted({rotulo[:3] for rotulo in self.ROTULOS_VALIDOS}))
     
-    def parse_brazilian_number(self, texto: str) -> Optional[Decimal]:
+    def parse_brazilian_number(self, texto: str) -> Optional[float]:
         """
-        Converte número brasileiro para Decimal
+        Converte número brasileiro para float
+        
+        Sem Decimal: float() de uma string decimal já é o valor mais
+        próximo (o mesmo que float(Decimal(...))), sem o custo do Decimal
         
         Args:
             texto: String com número (ex: "168.376,96")
             
         Returns:
-            Decimal ou None se inválido
+            float ou None se inválido
         """
         try:
             # Remove espaços
@@ -96,7 +143,7 @@ class FinancialLabelExtractor:
             # "168.376,96" -> "168376.96"
             texto_normalizado = texto.replace('.', '').replace(',', '.')
             
-            valor = Decimal(texto_normalizado)
+            valor = float(texto_normalizado)
             
             # Valida sanidade
             if valor > self.VALOR_MAX_RAZOAVEL:
@@ -109,7 +156,7 @@ class FinancialLabelExtractor:
             
             return valor
             
-        except (InvalidOperation, ValueError) as e:
+        except ValueError as e:
             logger.debug(f"Valor inválido '{texto}': {e}")
             return None
     
@@ -117,7 +164,7 @@ class FinancialLabelExtractor:
         self, 
         linha: str, 
         page_num: int
-    ) -> List[Dict]:
+    ) -> List[ValorRotulado]:
         """
         Extrai valores financeiros de uma linha APENAS com rótulos válidos
         
@@ -130,45 +177,68 @@ class FinancialLabelExtractor:
         """
         valores_encontrados = []
         
-        # Tenta cada rótulo válido
-        for rotulo, config in self.rotulo_patterns.items():
-            matches = config['pattern'].finditer(linha)
-            
-            for match in matches:
-                texto_valor = match.group(1)
-                valor_decimal = self.parse_brazilian_number(texto_valor)
-                
-                if valor_decimal is not None:
-                    valores_encontrados.append({
-                        'rotulo': rotulo,
-                        'campo': config['campo'],
-                        'valor_texto': texto_valor,
-                        'valor_decimal': float(valor_decimal),
-                        'pagina': page_num,
-                        'linha_original': linha.strip(),
-                        'status_validacao': 'OK',
-                        'posicao_match': match.start()
-                    })
-                else:
-                    # Valor ilegível ou suspeito
-                    valores_encontrados.append({
-                        'rotulo': rotulo,
-                        'campo': config['campo'],
-                        'valor_texto': texto_valor,
-                        'valor_decimal': None,
-                        'pagina': page_num,
-                        'linha_original': linha.strip(),
-                        'status_validacao': 'SUSPEITO',
-                        'motivo': f'Valor fora dos limites razoáveis: {texto_valor}'
-                    })
+        linha_upper = linha.upper()
+        if not any(prefixo in linha_upper for prefixo in self.prefixos_rotulos):
+            return valores_encontrados
+        
+        # Todos os rótulos válidos numa passada (matches na ordem da linha)
+        for match in self.rotulos_pattern.finditer(linha):
+            valores_encontrados.append(self._valor_from_match(match, linha, match.start(), page_num))
         
         return valores_encontrados
     
+    def _valor_from_match(self, match: re.Match, linha: str, posicao: int, page_num: int) -> ValorRotulado:
+        """
+        Monta o registro de um valor encontrado pela regex de rótulos
+        
+        Args:
+            match: Match de rotulos_pattern
+            linha: Linha onde o match ocorreu
+            posicao: Posição do match dentro da linha
+            page_num: Número da página
+            
+        Returns:
+            Valor extraído com status de validação
+        """
+        rotulo = self.rotulo_por_grupo[match.lastindex]
+        campo = self.ROTULOS_VALIDOS[rotulo]
+        texto_valor = match.group(match.lastindex + 1)
+        valor_decimal = self.parse_brazilian_number(texto_valor)
+        
+        if valor_decimal is not None:
+            # Casas decimais do texto (depois da vírgula, formato BR)
+            texto_limpo = texto_valor.strip()
+            casas = len(texto_limpo) - texto_limpo.rfind(',') - 1 if ',' in texto_limpo else 0
+            return ValorRotulado(
+                rotulo=rotulo,
+                campo=campo,
+                valor_texto=texto_valor,
+                valor_decimal=valor_decimal,
+                valor_centavos=round(valor_decimal * 100) if casas <= 2 else None,
+                pagina=page_num,
+                linha_original=linha.strip(),
+                status_validacao='OK',
+                posicao_match=posicao
+            )
+        
+        # Valor ilegível ou suspeito
+        return ValorRotulado(
+            rotulo=rotulo,
+            campo=campo,
+            valor_texto=texto_valor,
+            valor_decimal=None,
+            valor_centavos=None,
+            pagina=page_num,
+            linha_original=linha.strip(),
+            status_validacao='SUSPEITO',
+            motivo=f'Valor fora dos limites razoáveis: {texto_valor}'
+        )
+    
     def extract_from_text(
         self, 
         texto: str, 
         page_num: int
-    ) -> Dict[str, List[Dict]]:
+    ) -> Dict[str, List[ValorRotulado]]:
         """
         Extrai TODOS os valores financeiros de um texto com validação
         
@@ -179,29 +249,35 @@ class FinancialLabelExtractor:
         Returns:
             Dicionário agrupado por campo
         """
-        # Divide em linhas
-        linhas = texto.split('\n')
+        valores_por_campo = {}
         
-        # Extrai de cada linha
-        todos_valores = []
-        for linha in linhas:
-            if linha.strip():
-                valores = self.extract_from_line(linha, page_num)
-                todos_valores.extend(valores)
+        # Pré-filtro da página inteira (capa, página em branco...)
+        texto_upper = texto.upper()
+        if not any(prefixo in texto_upper for prefixo in self.prefixos_rotulos):
+            return valores_por_campo
         
-        # Agrupa por campo
-        valores_por_campo = {}
-        for valor in todos_valores:
-            campo = valor['campo']
-            if campo not in valores_por_campo:
-                valores_por_campo[campo] = []
-            valores_por_campo[campo].append(valor)
+        # Uma passada da regex no texto todo, sem dividir em linhas: a linha
+        # só é recortada quando há match (e reaproveitada entre matches dela)
+        inicio_linha = fim_linha = -1
+        linha = ''
+        for match in self.rotulos_pattern.finditer(texto):
+            if not inicio_linha <= match.start() < fim_linha:
+                inicio_linha = texto.rfind('\n', 0, match.start()) + 1
+                fim_linha = texto.find('\n', match.end())
+                if fim_linha == -1:
+                    fim_linha = len(texto)
+                linha = texto[inicio_linha:fim_linha]
+            
+            valor = self._valor_from_match(match, linha, match.start() - inicio_linha, page_num)
+            
+            # Agrupa por campo
+            valores_por_campo.setdefault(valor.campo, []).append(valor)
         
         return valores_por_campo
     
     def calculate_totals_safe(
         self, 
-        valores_por_campo: Dict[str, List[Dict]]
+        valores_por_campo: Dict[str, List[ValorRotulado]]
     ) -> Dict[str, any]:
         """
         Calcula totais COM VALIDAÇÃO DE SANIDADE
@@ -218,30 +294,32 @@ class FinancialLabelExtractor:
         campos_com_erro = []
         
         for campo, valores in valores_por_campo.items():
-            # Conta suspeitos
-            valores_suspeitos = [
-                v for v in valores 
-                if v['status_validacao'] == 'SUSPEITO'
-            ]
+            # Uma passada: conta suspeitos e separa os valores OK
+            suspeitos = 0
+            valores_ok = []
+            for v in valores:
+                if v.status_validacao == 'SUSPEITO':
+                    suspeitos += 1
+                elif v.status_validacao == 'OK' and v.valor_decimal is not None:
+                    valores_ok.append(v)
             
             # Se TEM valores suspeitos, BLOQUEIA o campo inteiro
-            if valores_suspeitos:
-                logger.warning(f"⚠️ Campo '{campo}' tem {len(valores_suspeitos)} valores suspeitos - BLOQUEANDO TOTAL")
+            if suspeitos:
+                logger.warning(f"⚠️ Campo '{campo}' tem {suspeitos} valores suspeitos - BLOQUEANDO TOTAL")
                 campos_com_erro.append(campo)
                 totais[f'total_{campo}'] = None
-                totais[f'total_{campo}_erro'] = f"{len(valores_suspeitos)} valores suspeitos detectados"
+                totais[f'total_{campo}_erro'] = f"{suspeitos} valores suspeitos detectados"
                 totais[f'total_{campo}_count'] = 0
                 continue
             
-            # Filtra apenas valores OK
-            valores_ok = [
-                v['valor_decimal'] 
-                for v in valores 
-                if v['status_validacao'] == 'OK' and v['valor_decimal'] is not None
-            ]
-            
             if valores_ok:
-                total = sum(valores_ok)
+                centavos = [v.valor_centavos for v in valores_ok]
+                if None not in centavos:
+                    # Soma vetorizada em int64 (exata); vira reais (float) só no total
+                    total = int(np.array(centavos, dtype=np.int64).sum()) / 100
+                else:
+                    # Valores com mais de 2 casas: soma em float, sem arredondar
+                    total = sum(v.valor_decimal for v in valores_ok)
                 
                 # VALIDAÇÃO FINAL: Total razoável?
                 if abs(total) > self.VALOR_MAX_RAZOAVEL:
@@ -267,7 +345,7 @@ class FinancialLabelExtractor:
     
     def validate_extraction(
         self, 
-        valores_por_campo: Dict[str, List[Dict]],
+        valores_por_campo: Dict[str, List[ValorRotulado]],
         totais: Dict
     ) -> Dict[str, any]:
         """
@@ -278,7 +356,7 @@ class FinancialLabelExtractor:
         """
         total_valores = sum(len(v) for v in valores_por_campo.values())
         valores_ok = sum(
-            len([x for x in v if x['status_validacao'] == 'OK']) 
+            len([x for x in v if x.status_validacao == 'OK']) 
             for v in valores_por_campo.values()
         )
         valores_suspeitos = total_valores - valores_ok
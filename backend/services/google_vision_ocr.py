@@ -5,19 +5,40 @@ MUITO MAIS PRECISO que Tesseract para documentos de baixa qualidade
 
 import os
 import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Generator
 from google.cloud import vision
 from pdf2image import convert_from_path
-from PyPDF2 import PdfReader
+from services.pdf_service import count_pages
 import io
 
 logger = logging.getLogger(__name__)
 
+# Chamadas simultâneas ao Vision (cada OCR é uma requisição HTTPS bloqueante;
+# threads esperando rede liberam o GIL)
+VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", 16))
+
+# Máximo de imagens por batch_annotate_images (limite da API)
+VISION_BATCH_LIMIT = 16
+
+# Qualidade do JPEG enviado ao Vision
+JPEG_QUALITY = 85
+
+# Idioma dos extratos: o Vision pula a detecção de idioma
+LANGUAGE_HINTS = ["pt"]
+
 
 class GoogleVisionOCR:
     """Serviço de OCR usando Google Vision API"""
     
-    def __init__(self, credentials_path: str = None, batch_size: int = 10, dpi: int = 300):
+    def __init__(
+        self,
+        credentials_path: str = None,
+        batch_size: int = 10,
+        dpi: int = 300,
+        max_concurrency: int = VISION_CONCURRENCY
+    ):
         """
         Inicializa o serviço de OCR com Google Vision
         
@@ -26,9 +47,11 @@ class GoogleVisionOCR:
                              Se None, usa a variável de ambiente GOOGLE_APPLICATION_CREDENTIALS
             batch_size: Páginas por batch (padrão: 10)
             dpi: Resolução das imagens (300 é suficiente para Google Vision)
+            max_concurrency: Páginas enviadas ao Vision ao mesmo tempo
         """
         self.batch_size = batch_size
         self.dpi = dpi
+        self.max_concurrency = max_concurrency
         
         # Configura credenciais
         if credentials_path and os.path.exists(credentials_path):
@@ -53,8 +76,7 @@ class GoogleVisionOCR:
     def get_page_count(self, pdf_path: str) -> int:
         """Conta páginas do PDF"""
         try:
-            reader = PdfReader(pdf_path)
-            return len(reader.pages)
+            return count_pages(pdf_path)
         except Exception as e:
             logger.error(f"Erro ao contar páginas: {e}")
             raise Exception(f"Erro ao ler PDF: {str(e)}")
@@ -64,59 +86,196 @@ class GoogleVisionOCR:
         pdf_path: str, 
         start_page: int, 
         end_page: int
-    ) -> List:
-        """Converte batch de páginas do PDF em imagens"""
+    ) -> List[bytes]:
+        """
+        Converte batch de páginas do PDF em imagens JPEG (bytes)
+        
+        O poppler grava os JPEGs direto em disco (paths_only) e só os bytes
+        são lidos: nenhuma página vira imagem PIL decodificada na memória
+        (~25 MB por página A4 a 300 DPI, contra ~1 MB do JPEG)
+        """
         try:
             logger.info(f"Extraindo páginas {start_page}-{end_page} (DPI: {self.dpi})")
-            images = convert_from_path(
-                pdf_path,
-                dpi=self.dpi,
-                first_page=start_page,
-                last_page=end_page,
-                fmt='png'
-            )
+            with tempfile.TemporaryDirectory(prefix="vision_pages_") as tmpdir:
+                paths = convert_from_path(
+                    pdf_path,
+                    dpi=self.dpi,
+                    first_page=start_page,
+                    last_page=end_page,
+                    fmt='jpeg',
+                    jpegopt={"quality": JPEG_QUALITY, "progressive": False, "optimize": False},
+                    output_folder=tmpdir,
+                    paths_only=True,
+                    # Divide o intervalo entre vários pdftoppm (um por núcleo)
+                    thread_count=min(end_page - start_page + 1, os.cpu_count() or 1)
+                )
+                images = []
+                for path in paths:
+                    with open(path, 'rb') as f:
+                        images.append(f.read())
             return images
         except Exception as e:
             logger.error(f"Erro ao converter páginas {start_page}-{end_page}: {e}")
             raise Exception(f"Erro ao converter PDF em imagens: {str(e)}")
     
+    def _image_to_bytes(self, image) -> bytes:
+        """
+        Codifica a imagem para envio ao Vision
+        
+        Bytes (JPEG de pdf_to_images_batch) vão direto. Imagem PIL vira
+        JPEG (qualidade 85) em vez de PNG: codifica bem mais rápido que o
+        deflate do PNG e o payload fica menor; o Vision decodifica de novo
+        de qualquer forma
+        """
+        if isinstance(image, bytes):
+            return image
+        
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        img_byte_arr = io.BytesIO()
+        image.save(img_byte_arr, format='JPEG', quality=JPEG_QUALITY, optimize=False)
+        return img_byte_arr.getvalue()
+    
+    def _text_from_response(self, response) -> str:
+        """
+        Texto completo de uma resposta do Vision
+        
+        Raises:
+            Exception: se a resposta veio com erro
+        """
+        if response.error.message:
+            raise Exception(f"Google Vision API error: {response.error.message}")
+        
+        # Texto completo direto do protobuf (sem montar a lista de
+        # text_annotations, uma entrada por palavra)
+        return response.full_text_annotation.text or ""
+    
     def extract_text_from_image(self, image) -> str:
         """
         Extrai texto de imagem usando Google Vision API
         
         Args:
-            image: Imagem PIL
+            image: Imagem PIL ou bytes JPEG/PNG
             
         Returns:
             Texto extraído
         """
         try:
-            # Converte PIL Image para bytes
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
-            
             # Cria objeto de imagem para Google Vision
-            vision_image = vision.Image(content=img_byte_arr)
-            
-            # Executa OCR
-            response = self.client.text_detection(image=vision_image)
+            vision_image = vision.Image(content=self._image_to_bytes(image))
             
-            if response.error.message:
-                raise Exception(f"Google Vision API error: {response.error.message}")
+            # Executa OCR (modo documento: texto denso, como extratos)
+            response = self.client.document_text_detection(
+                image=vision_image,
+                image_context=vision.ImageContext(language_hints=LANGUAGE_HINTS)
+            )
             
-            # Pega texto completo
-            texts = response.text_annotations
-            if texts:
-                # O primeiro elemento contém o texto completo
-                return texts[0].description
-            else:
-                return ""
+            return self._text_from_response(response)
                 
         except Exception as e:
             logger.error(f"Erro ao executar OCR: {e}")
             raise Exception(f"Erro ao executar Google Vision OCR: {str(e)}")
     
+    def process_image(self, image, page_num: int) -> Dict[str, any]:
+        """
+        Faz OCR de UMA página já renderizada
+        
+        Args:
+            image: Imagem da página (PIL ou bytes)
+            page_num: Número da página (1-indexed)
+            
+        Returns:
+            Resultado OCR da página (com "error" se falhar)
+        """
+        try:
+            logger.info(f"📄 Processando página {page_num} com Google Vision...")
+            
+            # OCR com Google Vision
+            text = self.extract_text_from_image(image)
+            
+            return self._page_result(page_num, text)
+            
+        except Exception as e:
+            return self._page_error(page_num, e)
+    
+    def _page_result(self, page_num: int, text: str) -> Dict[str, any]:
+        """Resultado OCR de uma página bem-sucedida"""
+        logger.info(f"✅ Página {page_num}: {len(text)} caracteres extraídos")
+        return {
+            "page": page_num,
+            "text": text,
+            "has_content": len(text.strip()) > 0,
+            "ocr_engine": "Google Vision API"
+        }
+    
+    def _page_error(self, page_num: int, error: Exception) -> Dict[str, any]:
+        """Resultado OCR de uma página que falhou"""
+        logger.error(f"Erro na página {page_num}: {error}")
+        return {
+            "page": page_num,
+            "text": "",
+            "has_content": False,
+            "error": str(error),
+            "ocr_engine": "Google Vision API"
+        }
+    
+    def process_images(self, images: List, page_nums: List[int]) -> List[Dict[str, any]]:
+        """
+        Faz OCR de várias páginas com batch_annotate_images
+        
+        Uma requisição para até VISION_BATCH_LIMIT imagens (em vez de uma
+        por página); se a requisição em lote falhar, refaz página a página
+        
+        Args:
+            images: Imagens das páginas (PIL ou bytes)
+            page_nums: Número de cada página (1-indexed)
+            
+        Returns:
+            Resultados OCR na mesma ordem (com "error" nas páginas que falharem)
+        """
+        if not images:
+            return []
+        
+        if len(images) > VISION_BATCH_LIMIT:
+            # Vários lotes: requisições em paralelo, resultados na ordem
+            chunks = range(0, len(images), VISION_BATCH_LIMIT)
+            workers = max(1, min(self.max_concurrency, len(chunks)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                parts = pool.map(
+                    lambda i: self.process_images(images[i:i + VISION_BATCH_LIMIT], page_nums[i:i + VISION_BATCH_LIMIT]),
+                    chunks
+                )
+                return [result for part in parts for result in part]
+        
+        try:
+            logger.info(f"📄 Processando páginas {page_nums[0]}-{page_nums[-1]} com Google Vision (lote)...")
+            feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+            image_context = vision.ImageContext(language_hints=LANGUAGE_HINTS)
+            requests = [
+                vision.AnnotateImageRequest(
+                    image=vision.Image(content=self._image_to_bytes(image)),
+                    features=[feature],
+                    image_context=image_context
+                )
+                for image in images
+            ]
+            batch_response = self.client.batch_annotate_images(requests=requests)
+        except Exception as e:
+            # Página a página, com as requisições em paralelo (resultados na ordem)
+            logger.warning(f"Lote do Google Vision falhou ({e}), processando página a página")
+            workers = max(1, min(self.max_concurrency, len(images)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(self.process_image, images, page_nums))
+        
+        results = []
+        for page_num, response in zip(page_nums, batch_response.responses):
+            try:
+                results.append(self._page_result(page_num, self._text_from_response(response)))
+            except Exception as e:
+                results.append(self._page_error(page_num, e))
+        
+        return results
+    
     def process_pdf_batch(
         self,
         pdf_path: str,
@@ -141,38 +300,8 @@ class GoogleVisionOCR:
             # Extrai apenas este batch
             images = self.pdf_to_images_batch(pdf_path, start_page, end_page)
             
-            # Processa cada página do batch
-            for idx, image in enumerate(images):
-                page_num = start_page + idx
-                
-                try:
-                    logger.info(f"📄 Processando página {page_num} com Google Vision...")
-                    
-                    # OCR com Google Vision
-                    text = self.extract_text_from_image(image)
-                    
-                    results.append({
-                        "page": page_num,
-                        "text": text,
-                        "has_content": len(text.strip()) > 0,
-                        "ocr_engine": "Google Vision API"
-                    })
-                    
-                    logger.info(f"✅ Página {page_num}: {len(text)} caracteres extraídos")
-                    
-                except Exception as e:
-                    logger.error(f"Erro na página {page_num}: {e}")
-                    results.append({
-                        "page": page_num,
-                        "text": "",
-                        "has_content": False,
-                        "error": str(e),
-                        "ocr_engine": "Google Vision API"
-                    })
-                
-                finally:
-                    # Libera memória
-                    del image
+            # OCR em lote (uma requisição a cada VISION_BATCH_LIMIT páginas)
+            results = self.process_images(images, list(range(start_page, start_page + len(images))))
             
             return results
             
@@ -204,10 +333,6 @@ class GoogleVisionOCR:
                 batch_results = self.process_pdf_batch(pdf_path, start, end)
                 
                 yield batch_results
-                
-                # Força garbage collection entre batches
-                import gc
-                gc.collect()
         
         except Exception as e:
             logger.exception(f"Erro ao processar PDF em batches: {e}")
@@ -0,0 +1,235 @@
+"""
+Pipeline de OCR em 3 estágios: renderização → OCR → extração
+
+Cada estágio roda numa thread própria, ligadas por filas limitadas:
+enquanto a página N passa pelo OCR, a N+1 já está sendo renderizada
+e a N-1 extraída. As filas limitadas dão backpressure (memória fixa).
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Marca fim de fluxo entre estágios
+_SENTINEL = None
+
+# Tamanho máximo de cada fila (páginas em trânsito)
+QUEUE_SIZE = 16
+
+# Mini-batch do OCR: processa ao juntar N páginas ou após WAIT_MS
+BATCH_THRESHOLD = 8
+WAIT_MS = 200
+
+
+class OCRPipeline:
+    """Pipeline renderização → OCR → extração com filas limitadas"""
+
+    def __init__(
+        self,
+        ocr_service,
+        extract_page: Callable[[Dict], Dict],
+        queue_size: int = QUEUE_SIZE,
+        batch_threshold: int = BATCH_THRESHOLD,
+        wait_ms: int = WAIT_MS,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        ocr_workers: int = 1
+    ):
+        """
+        Inicializa o pipeline
+
+        Args:
+            ocr_service: Serviço com get_page_count, pdf_to_images_batch,
+                         process_image e batch_size (OCRService/GoogleVisionOCR);
+                         se tiver process_images, cada mini-batch vai inteiro nele
+            extract_page: Função que extrai dados de um resultado OCR
+            queue_size: Capacidade de cada fila
+            batch_threshold: Páginas por mini-batch de OCR
+            wait_ms: Espera máxima para completar um mini-batch
+            progress_callback: Chamada com (páginas_prontas, total) a cada página
+            ocr_workers: Máximo de páginas em OCR simultâneo (threads;
+                         útil para OCR remoto, que espera rede)
+        """
+        self.ocr_service = ocr_service
+        self.extract_page = extract_page
+        self.queue_size = queue_size
+        self.batch_threshold = batch_threshold
+        self.wait_s = wait_ms / 1000
+        self.progress_callback = progress_callback
+        self.ocr_workers = ocr_workers
+
+    def run(self, pdf_path: str) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Executa o pipeline completo para um PDF
+
+        Args:
+            pdf_path: Caminho do arquivo PDF
+
+        Returns:
+            (resultados OCR, dados extraídos por página), ambos por página
+
+        Raises:
+            Exception: primeiro erro ocorrido em qualquer estágio
+        """
+        render_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        ocr_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        ocr_results: List[Dict] = []
+        paginas: List[Dict] = []
+        errors: List[Exception] = []
+
+        total_pages = self.ocr_service.get_page_count(pdf_path)
+
+        stages = [
+            threading.Thread(target=self._render, args=(pdf_path, total_pages, render_q, errors), name="ocr-render"),
+            threading.Thread(target=self._ocr, args=(render_q, ocr_q, errors), name="ocr-ocr"),
+            threading.Thread(
+                target=self._extract,
+                args=(ocr_q, total_pages, ocr_results, paginas, errors),
+                name="ocr-extract"
+            ),
+        ]
+        for stage in stages:
+            stage.start()
+        for stage in stages:
+            stage.join()
+
+        if errors:
+            raise errors[0]
+
+        ocr_results.sort(key=lambda r: r["page"])
+        paginas.sort(key=lambda p: p["page"])
+        return ocr_results, paginas
+
+    def _render(self, pdf_path: str, total_pages: int, out_q: queue.Queue, errors: List[Exception]):
+        """Estágio 1: renderiza páginas (em batches do serviço) e enfileira"""
+        try:
+            batch_size = self.ocr_service.batch_size
+            logger.info(f"Pipeline: {total_pages} páginas, renderização em batches de {batch_size}")
+
+            for start in range(1, total_pages + 1, batch_size):
+                if errors:
+                    break
+                end = min(start + batch_size - 1, total_pages)
+                images = self.ocr_service.pdf_to_images_batch(pdf_path, start, end)
+                for idx, image in enumerate(images):
+                    if errors:
+                        # Outro estágio falhou: para sem enfileirar o resto
+                        break
+                    out_q.put((start + idx, image))
+                del images
+        except Exception as e:
+            logger.exception(f"Erro na renderização: {e}")
+            errors.append(e)
+        finally:
+            out_q.put(_SENTINEL)
+
+    def _next_batch(self, in_q: queue.Queue) -> Tuple[List, bool]:
+        """
+        Junta até batch_threshold itens ou até estourar wait_ms
+
+        Returns:
+            (itens, fim_do_fluxo)
+        """
+        item = in_q.get()
+        if item is _SENTINEL:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.wait_s
+        while len(batch) < self.batch_threshold:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = in_q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _SENTINEL:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _ocr(self, in_q: queue.Queue, out_q: queue.Queue, errors: List[Exception]):
+        """
+        Estágio 2: OCR em mini-batches
+        
+        Com process_images, o mini-batch é uma tarefa só (ex.: uma requisição
+        em lote ao Vision); senão, uma tarefa por página. Até ocr_workers
+        páginas ficam em voo ao mesmo tempo (limita a memória das imagens)
+        """
+        process_images = getattr(self.ocr_service, "process_images", None)
+        in_flight: Dict[Future, int] = {}
+        # Fim do fluxo (sentinela já lido da entrada)
+        done = False
+        try:
+            with ThreadPoolExecutor(max_workers=self.ocr_workers, thread_name_prefix="ocr-page") as pool:
+                while not done:
+                    batch, done = self._next_batch(in_q)
+                    page_nums = [page_num for page_num, _ in batch]
+                    images = [image for _, image in batch]
+                    
+                    if process_images is not None:
+                        tasks = [(process_images, images, page_nums)] if batch else []
+                    else:
+                        tasks = [(self._process_one, [image], [page_num]) for image, page_num in zip(images, page_nums)]
+                    del batch, images
+                    
+                    for fn, task_images, task_pages in tasks:
+                        # Espera vaga antes de submeter (sempre aceita se nada está em voo)
+                        while in_flight and sum(in_flight.values()) + len(task_pages) > self.ocr_workers:
+                            self._emit_finished(in_flight, out_q)
+                        in_flight[pool.submit(fn, task_images, task_pages)] = len(task_pages)
+                    del tasks
+                
+                while in_flight:
+                    self._emit_finished(in_flight, out_q)
+        except Exception as e:
+            logger.exception(f"Erro no OCR: {e}")
+            errors.append(e)
+            # Drena a entrada para não travar a renderização (que para ao ver
+            # o erro). Se o sentinela já foi lido, não há mais nada a drenar:
+            # outro get() bloquearia para sempre
+            if not done:
+                while in_q.get() is not _SENTINEL:
+                    pass
+        finally:
+            out_q.put(_SENTINEL)
+    
+    def _process_one(self, images: List, page_nums: List[int]) -> List[Dict]:
+        """OCR de uma página via process_image (mesma assinatura de process_images)"""
+        # process_image já captura erros por página
+        return [self.ocr_service.process_image(images[0], page_nums[0])]
+    
+    def _emit_finished(self, in_flight: Dict[Future, int], out_q: queue.Queue):
+        """Espera alguma tarefa de OCR terminar e envia os resultados à extração"""
+        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in finished:
+            del in_flight[future]
+            for result in future.result():
+                out_q.put(result)
+
+    def _extract(
+        self,
+        in_q: queue.Queue,
+        total_pages: int,
+        ocr_results: List[Dict],
+        paginas: List[Dict],
+        errors: List[Exception]
+    ):
+        """Estágio 3: extrai dados de cada página assim que o OCR termina"""
+        while (ocr_result := in_q.get()) is not _SENTINEL:
+            ocr_results.append(ocr_result)
+            if errors:
+                # Outro estágio falhou: só drena a fila
+                continue
+            try:
+                paginas.append(self.extract_page(ocr_result))
+                if self.progress_callback:
+                    self.progress_callback(len(paginas), total_pages)
+            except Exception as e:
+                logger.exception(f"Erro na extração da página {ocr_result.get('page')}: {e}")
+                errors.append(e)
@@ -9,7 +9,11 @@ REFATORADO: Suporta processamento em batches para PDFs grandes
 import os
 import tempfile
 import logging
-from typing import List, Dict, Generator
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from importlib.util import find_spec
+from operator import itemgetter
+from typing import Callable, List, Dict, Generator, Optional
 import cv2
 import numpy as np
 from pdf2image import convert_from_path
@@ -17,8 +21,62 @@ from PyPDF2 import PdfReader
 import pytesseract
 from PIL import Image
 
+if find_spec("tesserocr") is not None:
+    # Uma página por thread, cada uma com seu Tesseract: sem threads OpenMP
+    # extras por página. Precisa vir antes de carregar a lib (o OpenMP lê
+    # a variável ao inicializar)
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    from tesserocr import PyTessBaseAPI, PSM, OEM
+else:  # tesserocr é opcional: sem ele, usa pytesseract (um subprocesso por página)
+    PyTessBaseAPI = None
+
+from services.pdf_service import count_pages, page_has_fonts, page_ranges, pdfium, render_pages_pdfium
+
 logger = logging.getLogger(__name__)
 
+# Resolução mínima para o OCR: imagens abaixo disso são ampliadas
+OCR_MIN_DPI = 300
+
+# Resolução máxima entregue ao Tesseract: o custo do LSTM cresce com os
+# pixels e acima disso não melhora o reconhecimento
+OCR_MAX_DPI = 300
+
+# Caracteres visíveis (sem espaços) para usar a camada de texto do PDF no
+# lugar do OCR
+TEXT_LAYER_MIN_CHARS = 50
+
+# Processos de OCR por PDF (páginas em paralelo)
+OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", min(os.cpu_count() or 1, 8)))
+
+# Instância do serviço em cada processo do pool de páginas
+_page_worker_service: Optional["OCRService"] = None
+
+
+def _opencv_threads(workers: int) -> int:
+    """Threads do OpenCV para cada um de `workers` OCRs simultâneos (divide os núcleos)"""
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def _init_page_worker(dpi: int, workers: int = 1):
+    """Inicializa processo do pool de páginas (uma instância por processo)"""
+    global _page_worker_service
+    # Tesseract com 1 thread: o paralelismo vem dos processos
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    # Idem para o OpenCV: sem isso cada processo usaria todos os núcleos no
+    # pré-processamento (workers x núcleos threads disputando a CPU)
+    cv2.setNumThreads(_opencv_threads(workers))
+    _page_worker_service = OCRService(dpi=dpi, batch_size=1)
+
+
+def _ocr_one_page(pdf_path: str, page_num: int) -> Dict[str, any]:
+    """Converte e faz OCR de UMA página (roda no pool de páginas)"""
+    return _page_worker_service.process_pdf_batch(pdf_path, page_num, page_num)[0]
+
+
+def _ocr_page_image(image, page_num: int) -> Dict[str, any]:
+    """Faz OCR de UMA página já renderizada (roda no pool de páginas)"""
+    return _page_worker_service.process_image(image, page_num)
+
 
 class OCRService:
     """Serviço responsável por OCR de documentos PDF"""
@@ -37,6 +95,24 @@ class OCRService:
         self.dpi = dpi
         self.batch_size = batch_size
         
+        # Objetos do pré-processamento criados uma vez (não a cada página).
+        # O CLAHE guarda buffers internos: um por thread (_get_clahe)
+        self._kernel_sharpen = np.array([[-1, -1, -1],
+                                         [-1,  9, -1],
+                                         [-1, -1, -1]], dtype=np.float32)
+        self._kernel_close = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+        self._kernel_dilate = np.ones((2, 2), np.uint8)
+        
+        # Tesseract em processo (tesserocr): um handle por thread, com o
+        # modelo carregado no primeiro OCR da thread e reaproveitado nas
+        # páginas seguintes. O tesserocr libera o GIL durante o
+        # reconhecimento, então threads escalam como processos (sem fork,
+        # IPC nem cópia das imagens)
+        self._local = threading.local()
+        self._tess_apis = []
+        self._tess_lock = threading.Lock()
+        self._ocr_threads: Optional[ThreadPoolExecutor] = None
+        
         logger.info(f"OCR iniciado: DPI={dpi}, PSM=4 (detecção de colunas)")
     
     def get_page_count(self, pdf_path: str) -> int:
@@ -50,8 +126,7 @@ class OCRService:
             Número de páginas
         """
         try:
-            reader = PdfReader(pdf_path)
-            return len(reader.pages)
+            return count_pages(pdf_path)
         except Exception as e:
             logger.error(f"Erro ao contar páginas: {e}")
             raise Exception(f"Erro ao ler PDF: {str(e)}")
@@ -61,28 +136,39 @@ class OCRService:
         pdf_path: str, 
         start_page: int, 
         end_page: int
-    ) -> List[Image.Image]:
+    ) -> List[np.ndarray]:
         """
         Converte BATCH de páginas (não o PDF inteiro)
         
         CRÍTICO: Usa first_page/last_page para não carregar tudo na RAM
         
+        Com pypdfium2 renderiza no próprio processo, direto para arrays em
+        tons de cinza (sem subprocesso do pdftoppm nem arquivos temporários
+        por batch); senão, usa pdf2image
+        
         Args:
             pdf_path: Caminho do arquivo PDF
             start_page: Página inicial (1-indexed)
             end_page: Página final (1-indexed, inclusive)
             
         Returns:
-            Lista de imagens PIL apenas do batch
+            Lista de imagens em tons de cinza (arrays numpy ou PIL modo L)
+            apenas do batch
         """
         try:
             logger.info(f"Extraindo páginas {start_page}-{end_page} (DPI: {self.dpi})")
+            if pdfium is not None:
+                return render_pages_pdfium(pdf_path, start_page, end_page, self.dpi)
+            
             images = convert_from_path(
                 pdf_path,
                 dpi=self.dpi,
                 first_page=start_page,
                 last_page=end_page,
-                fmt='png',
+                # PGM cru em tons de cinza: sem codificar/decodificar PNG e
+                # 1/3 dos bytes do RGB (o pré-processamento só usa cinza)
+                fmt='ppm',
+                grayscale=True,
                 thread_count=2  # Reduzido para não competir com ProcessPool
             )
             return images
@@ -96,13 +182,14 @@ class OCRService:
         OTIMIZADO para documentos escaneados de BAIXA QUALIDADE
         
         Args:
-            image: Imagem PIL
+            image: Imagem PIL ou array numpy
             
         Returns:
-            Imagem processada como array numpy
+            Imagem processada como array numpy (até OCR_MAX_DPI, usa um
+            buffer da thread: vale até o próximo preprocess_image nela)
         """
-        # Converte PIL Image para array numpy
-        img_array = np.array(image)
+        # Array numpy da imagem (sem copiar: só é lido)
+        img_array = np.asarray(image)
         
         # Converte para escala de cinza
         if len(img_array.shape) == 3:
@@ -110,48 +197,123 @@ class OCRService:
         else:
             gray = img_array
         
-        # PASSO 1: Redimensiona para AUMENTAR resolução (1.5x ao invés de 2x)
-        # Balanço entre qualidade e velocidade
+        # PASSO 1: Redimensiona para AUMENTAR resolução só abaixo de OCR_MIN_DPI
+        # (200 DPI -> 1.5x). A 300+ DPI a letra já tem a altura que o LSTM
+        # do Tesseract espera: ampliar só multiplicaria os pixels de todos
+        # os passos seguintes (2.25x a 400 DPI)
+        # Daqui em diante os passos alternam entre dois buffers (dst=) da
+        # thread, reaproveitados de uma página para outra em vez de alocar
+        # imagens novas (~15 MB cada a 400 DPI). Mesmo resultado: cada
+        # filtro lê um buffer e grava no outro
+        scale = OCR_MIN_DPI / self.dpi
         height, width = gray.shape
-        gray = cv2.resize(gray, (int(width * 1.5), int(height * 1.5)), interpolation=cv2.INTER_CUBIC)
+        if scale > 1:
+            size = (int(width * scale), int(height * scale))
+            buffer, work = self._get_work_buffers((size[1], size[0]))
+            gray = cv2.resize(gray, size, dst=work, interpolation=cv2.INTER_CUBIC)
+        else:
+            # Os passos seguintes gravam em gray: não altera a imagem de entrada
+            buffer, work = self._get_work_buffers((height, width))
+            np.copyto(work, gray)
+            gray = work
         
         # PASSO 2: Denoise RÁPIDO (Gaussian Blur ao invés de fastNlMeans)
-        denoised = cv2.GaussianBlur(gray, (3, 3), 0)
+        cv2.GaussianBlur(gray, (3, 3), 0, dst=buffer)
         
         # PASSO 3: Aumenta contraste FORTE
-        clahe = cv2.createCLAHE(clipLimit=4.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(denoised)
+        self._get_clahe().apply(buffer, dst=gray)
         
         # PASSO 4: Sharpen para realçar bordas dos caracteres
-        kernel_sharpen = np.array([[-1,-1,-1],
-                                   [-1, 9,-1],
-                                   [-1,-1,-1]])
-        sharpened = cv2.filter2D(enhanced, -1, kernel_sharpen)
+        cv2.filter2D(gray, -1, self._kernel_sharpen, dst=buffer)
         
         # PASSO 5: Binarização ADAPTATIVA (melhor que Otsu para documentos não uniformes)
-        binary = cv2.adaptiveThreshold(
-            sharpened, 
+        cv2.adaptiveThreshold(
+            buffer, 
             255, 
             cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
             cv2.THRESH_BINARY, 
             15,  # Block size (aumentado para documentos escaneados)
-            3    # C constant
+            3,   # C constant
+            dst=gray
         )
         
         # PASSO 6: Morfologia para limpar ruído pequeno
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
-        cleaned = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+        cv2.morphologyEx(gray, cv2.MORPH_CLOSE, self._kernel_close, dst=buffer)
         
         # PASSO 7: Dilata LEVEMENTE para conectar caracteres quebrados
-        kernel_dilate = np.ones((2, 2), np.uint8)
-        final = cv2.dilate(cleaned, kernel_dilate, iterations=1)
+        cv2.dilate(buffer, self._kernel_dilate, dst=gray, iterations=1)
+        
+        # PASSO 8: Acima de OCR_MAX_DPI, reduz a imagem binarizada antes do
+        # OCR (400 DPI -> 0.75x, ~44% menos pixels). A binarização aproveitou
+        # a resolução cheia; INTER_AREA faz a média dos pixels (bordas suaves)
+        scale = OCR_MAX_DPI / self.dpi
+        if scale < 1:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
         
-        return final
+        return gray
+    
+    def _get_clahe(self) -> "cv2.CLAHE":
+        """CLAHE da thread atual (criado na primeira página da thread)"""
+        clahe = getattr(self._local, "clahe", None)
+        if clahe is None:
+            clahe = self._local.clahe = cv2.createCLAHE(clipLimit=4.0, tileGridSize=(8, 8))
+        return clahe
+    
+    def _get_work_buffers(self, shape: tuple) -> tuple:
+        """
+        Par de buffers uint8 da thread atual para o pré-processamento
+        
+        Reaproveitados enquanto as páginas tiverem o mesmo tamanho (o caso
+        normal num PDF); realocados quando o tamanho muda
+        """
+        buffers = getattr(self._local, "work_buffers", None)
+        if buffers is None or buffers[0].shape != shape:
+            buffers = self._local.work_buffers = (
+                np.empty(shape, dtype=np.uint8),
+                np.empty(shape, dtype=np.uint8)
+            )
+        return buffers
+    
+    def _get_tess_api(self) -> "PyTessBaseAPI":
+        """Handle do tesserocr da thread atual (mesma config de tesseract_config: OEM 3, PSM 4, por)"""
+        api = getattr(self._local, "tess_api", None)
+        if api is None:
+            api = self._local.tess_api = PyTessBaseAPI(lang='por', psm=PSM.SINGLE_COLUMN, oem=OEM.DEFAULT)
+            with self._tess_lock:
+                self._tess_apis.append(api)
+        return api
+    
+    def _get_ocr_threads(self) -> ThreadPoolExecutor:
+        """Pool de threads de OCR (criado uma vez: cada thread mantém seu Tesseract)"""
+        with self._tess_lock:
+            if self._ocr_threads is None:
+                self._ocr_threads = ThreadPoolExecutor(max_workers=OCR_CONCURRENCY, thread_name_prefix="ocr-page")
+                # Páginas pré-processadas em paralelo: o OpenCV divide os núcleos
+                cv2.setNumThreads(_opencv_threads(OCR_CONCURRENCY))
+            return self._ocr_threads
+    
+    def close(self):
+        """Encerra as threads de OCR e libera os handles do tesserocr"""
+        with self._tess_lock:
+            threads, self._ocr_threads = self._ocr_threads, None
+            apis, self._tess_apis = self._tess_apis, []
+        if threads is not None:
+            threads.shutdown()
+        for api in apis:
+            api.End()
+    
+    def __del__(self):
+        """Garante o End() do Tesseract quando o serviço é descartado"""
+        self.close()
     
     def extract_text_from_image(self, processed_image: np.ndarray) -> str:
         """
         Extrai texto de imagem processada usando Tesseract
         
+        Com tesserocr, os pixels vão direto do array para o Tesseract já
+        carregado (sem subprocesso, PNG temporário nem recarga do modelo
+        por página); sem ele, usa pytesseract
+        
         Args:
             processed_image: Imagem processada como array numpy
             
@@ -159,61 +321,100 @@ class OCRService:
             Texto extraído
         """
         try:
-            # Converte array numpy de volta para PIL Image
-            pil_image = Image.fromarray(processed_image)
-            
-            # Executa OCR
-            text = pytesseract.image_to_string(
-                pil_image,
-                config=self.tesseract_config
-            )
+            if PyTessBaseAPI is not None and processed_image.ndim == 2:
+                image = np.ascontiguousarray(processed_image)
+                height, width = image.shape
+                api = self._get_tess_api()
+                api.SetImageBytes(image.tobytes(), width, height, 1, width)
+                text = api.GetUTF8Text()
+            else:
+                # Converte array numpy de volta para PIL Image
+                pil_image = Image.fromarray(processed_image)
+                
+                # Executa OCR
+                text = pytesseract.image_to_string(
+                    pil_image,
+                    config=self.tesseract_config
+                )
             
             return text.strip()
         except Exception as e:
             raise Exception(f"Erro ao executar OCR: {str(e)}")
     
+    def process_image(self, image: Image.Image, page_num: int) -> Dict[str, any]:
+        """
+        Pré-processa e faz OCR de UMA página já renderizada
+        
+        Args:
+            image: Imagem PIL da página
+            page_num: Número da página (1-indexed)
+            
+        Returns:
+            Resultado OCR da página (com "error" se falhar)
+        """
+        processed = None
+        
+        try:
+            # Pré-processa
+            processed = self.preprocess_image(image)
+            
+            # OCR
+            text = self.extract_text_from_image(processed)
+            
+            return {
+                "page": page_num,
+                "text": text,
+                "has_content": len(text.strip()) > 0
+            }
+            
+        except Exception as e:
+            logger.error(f"Erro na página {page_num}: {e}")
+            return {
+                "page": page_num,
+                "text": "",
+                "has_content": False,
+                "error": str(e)
+            }
+        
+        finally:
+            # Libera memória IMEDIATAMENTE
+            if processed is not None:
+                del processed
+    
     def process_pdf_batch(
         self,
         pdf_path: str,
         start_page: int,
-        end_page: int
+        end_page: int,
+        pool: Optional[ProcessPoolExecutor] = None
     ) -> List[Dict[str, any]]:
         """
         Processa UM BATCH de páginas do PDF
         
+        Páginas que já têm camada de texto (PDF híbrido) usam esse texto,
+        sem OCR. Com pool (de _init_page_worker), cada página do batch vai
+        para um processo, que faz essa checagem, a converte e faz o OCR. Sem
+        pool, as páginas sem texto são convertidas aqui e, com tesserocr, o
+        OCR roda em paralelo nas threads de OCR (senão em série)
+        
         Args:
             pdf_path: Caminho do arquivo PDF
             start_page: Página inicial (1-indexed)
             end_page: Página final (1-indexed)
+            pool: Pool de páginas (opcional)
             
         Returns:
             Lista de resultados apenas do batch processado
         """
-        results = []
-        images = None
-        
-        try:
-            # Extrai apenas este batch
-            images = self.pdf_to_images_batch(pdf_path, start_page, end_page)
-            
-            # Processa cada página do batch
-            for idx, image in enumerate(images):
-                page_num = start_page + idx
-                processed = None
-                
+        if pool is not None:
+            futures = [
+                (page_num, pool.submit(_ocr_one_page, pdf_path, page_num))
+                for page_num in range(start_page, end_page + 1)
+            ]
+            results = []
+            for page_num, future in futures:
                 try:
-                    # Pré-processa
-                    processed = self.preprocess_image(image)
-                    
-                    # OCR
-                    text = self.extract_text_from_image(processed)
-                    
-                    results.append({
-                        "page": page_num,
-                        "text": text,
-                        "has_content": len(text.strip()) > 0
-                    })
-                    
+                    results.append(future.result())
                 except Exception as e:
                     logger.error(f"Erro na página {page_num}: {e}")
                     results.append({
@@ -222,25 +423,133 @@ class OCRService:
                         "has_content": False,
                         "error": str(e)
                     })
-                
-                finally:
-                    # Libera memória IMEDIATAMENTE
-                    if processed is not None:
-                        del processed
-                    del image
-            
             return results
+        
+        # Páginas com camada de texto (PDF híbrido) dispensam o OCR
+        text_layer = self.text_layer_pages(pdf_path, start_page, end_page)
+        results = [
+            {"page": page_num, "text": text, "has_content": True}
+            for page_num, text in text_layer.items()
+        ]
+        
+        # O resto é convertido e passa pelo OCR (uma conversão por trecho contínuo)
+        pending = (page_num for page_num in range(start_page, end_page + 1) if page_num not in text_layer)
+        for range_start, range_end in page_ranges(pending):
+            results.extend(self._ocr_pages(pdf_path, range_start, range_end))
+        
+        if text_layer:
+            results.sort(key=itemgetter("page"))
+        return results
+    
+    def text_layer_pages(self, pdf_path: str, start_page: int, end_page: int) -> Dict[int, str]:
+        """
+        Texto das páginas que já têm camada de texto selecionável
+        
+        Extrair o texto do PDF leva milissegundos; o OCR da mesma página,
+        centenas. Páginas escaneadas (sem fontes) ficam de fora sem nem
+        chamar o extract_text. O PDF é lido do arquivo aberto, sob demanda
+        (com o caminho, o PyPDF2 copiaria o arquivo inteiro para a memória
+        a cada batch)
+        
+        Args:
+            pdf_path: Caminho do arquivo PDF
+            start_page: Página inicial (1-indexed)
+            end_page: Página final (1-indexed)
+            
+        Returns:
+            {página: texto} das páginas com pelo menos TEXT_LAYER_MIN_CHARS
+            caracteres visíveis
+        """
+        texts = {}
+        try:
+            with open(pdf_path, "rb") as pdf_file:
+                reader = PdfReader(pdf_file)
+                for page_num in range(start_page, end_page + 1):
+                    page = reader.pages[page_num - 1]
+                    if not page_has_fonts(page):
+                        continue
+                    text = page.extract_text() or ""
+                    if len("".join(text.split())) >= TEXT_LAYER_MIN_CHARS:
+                        texts[page_num] = text.strip()
+        except Exception as e:
+            # Sem camada de texto legível: tudo vai para o OCR
+            logger.debug(f"Camada de texto indisponível ({start_page}-{end_page}): {e}")
+        return texts
+    
+    def _ocr_pages(self, pdf_path: str, start_page: int, end_page: int) -> List[Dict[str, any]]:
+        """Converte um trecho contínuo de páginas e faz o OCR delas"""
+        images = None
+        
+        try:
+            # Extrai apenas este batch
+            images = self.pdf_to_images_batch(pdf_path, start_page, end_page)
+            
+            return self.process_images(images, list(range(start_page, start_page + len(images))))
             
         finally:
             # Garante limpeza do batch
             if images is not None:
                 del images
     
+    def process_images(
+        self,
+        images: List,
+        page_nums: List[int],
+        pool: Optional[ProcessPoolExecutor] = None
+    ) -> List[Dict[str, any]]:
+        """
+        Faz OCR de várias páginas já renderizadas, em paralelo quando possível
+        
+        Com pool (de create_page_pool), cada página vai para um processo;
+        com tesserocr, para as threads de OCR; senão, em série
+        
+        Args:
+            images: Imagens das páginas (PIL ou arrays numpy)
+            page_nums: Número de cada página (1-indexed)
+            pool: Pool de páginas (opcional)
+            
+        Returns:
+            Resultados OCR na mesma ordem (com "error" nas páginas que falharem)
+        """
+        if pool is not None:
+            return list(pool.map(_ocr_page_image, images, page_nums))
+        
+        if PyTessBaseAPI is not None and len(images) > 1:
+            # Threads com Tesseract próprio (GIL liberado no OCR)
+            return list(self._get_ocr_threads().map(self.process_image, images, page_nums))
+        
+        return [self.process_image(image, page_num) for image, page_num in zip(images, page_nums)]
+    
+    def create_page_pool(self, pages: int) -> Optional[ProcessPoolExecutor]:
+        """
+        Pool de processos para OCR de páginas em paralelo
+        
+        Um processo por página (no máximo OCR_CONCURRENCY e batch_size);
+        com tesserocr as threads de OCR dispensam processos
+        
+        Args:
+            pages: Total de páginas a processar
+            
+        Returns:
+            ProcessPoolExecutor (quem chama faz o shutdown) ou None se não compensa
+        """
+        workers = min(OCR_CONCURRENCY, self.batch_size, pages)
+        if workers <= 1 or PyTessBaseAPI is not None:
+            return None
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_page_worker,
+            initargs=(self.dpi, workers)
+        )
+    
     def process_pdf_in_batches(self, pdf_path: str) -> Generator[List[Dict], None, None]:
         """
         Generator que processa PDF em batches
         
-        IMPORTANTE: Libera memória entre batches
+        IMPORTANTE: Libera memória entre batches. As páginas de cada batch
+        rodam em paralelo: com tesserocr, nas threads de OCR; senão, num
+        pool de processos (Tesseract com 1 thread em cada) criado uma vez
+        para o PDF inteiro
         
         Args:
             pdf_path: Caminho do arquivo PDF
@@ -248,27 +557,89 @@ class OCRService:
         Yields:
             Lista de resultados de cada batch
         """
+        pool = None
         try:
             # Conta páginas
             total_pages = self.get_page_count(pdf_path)
             logger.info(f"PDF com {total_pages} páginas, dividindo em batches de {self.batch_size}")
             
+            # Páginas do batch em processos paralelos (com tesserocr,
+            # process_pdf_batch usa threads e o pool fica None)
+            pool = self.create_page_pool(total_pages)
+            
             # Processa em batches
             for start in range(1, total_pages + 1, self.batch_size):
                 end = min(start + self.batch_size - 1, total_pages)
                 
                 logger.info(f"Processando batch: páginas {start}-{end}")
-                batch_results = self.process_pdf_batch(pdf_path, start, end)
+                batch_results = self.process_pdf_batch(pdf_path, start, end, pool)
                 
                 yield batch_results
-                
-                # Força garbage collection entre batches (opcional)
-                import gc
-                gc.collect()
         
         except Exception as e:
             logger.exception(f"Erro ao processar PDF em batches: {e}")
             raise Exception(f"Erro ao processar PDF: {str(e)}")
+        
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    
+    def process_pdf_parallel(
+        self,
+        pdf_path: str,
+        max_workers: Optional[int] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> List[Dict[str, any]]:
+        """
+        Processa páginas em paralelo num ProcessPoolExecutor próprio
+        
+        Cada processo converte e faz OCR da sua página (as imagens não
+        trafegam entre processos). OCR é CPU-bound e independente por página.
+        
+        Args:
+            pdf_path: Caminho do arquivo PDF
+            max_workers: Processos simultâneos (padrão: OCR_CONCURRENCY)
+            progress_callback: Chamada com (páginas_prontas, total) a cada página
+            
+        Returns:
+            Lista completa de resultados OCR, ordenada por página
+        """
+        total_pages = self.get_page_count(pdf_path)
+        if total_pages == 0:
+            return []
+        
+        workers = min(max_workers or OCR_CONCURRENCY, total_pages)
+        logger.info(f"PDF com {total_pages} páginas, OCR paralelo com {workers} processos")
+        
+        results = []
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_page_worker,
+            initargs=(self.dpi, workers)
+        ) as pool:
+            futures = {
+                pool.submit(_ocr_one_page, pdf_path, page_num): page_num
+                for page_num in range(1, total_pages + 1)
+            }
+            
+            for future in as_completed(futures):
+                page_num = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"Erro na página {page_num}: {e}")
+                    results.append({
+                        "page": page_num,
+                        "text": "",
+                        "has_content": False,
+                        "error": str(e)
+                    })
+                
+                if progress_callback:
+                    progress_callback(len(results), total_pages)
+        
+        results.sort(key=itemgetter("page"))
+        return results
     
     def process_pdf(self, pdf_path: str) -> List[Dict[str, any]]:
         """
@@ -3,7 +3,13 @@ Serviço para filtrar páginas relevantes do documento
 Identifica páginas que contêm informações de convênio bancário
 """
 
-from typing import List, Dict
+from collections import Counter
+from typing import Dict, Iterable, Iterator
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick é opcional: sem ele, usa "in" por palavra-chave
+    ahocorasick = None
 
 
 class PageFilter:
@@ -38,6 +44,26 @@ class PageFilter:
             "NUBANK",
             "INTER"
         ]
+        
+        # Palavras-chave que sozinhas já tornam a página relevante
+        self.high_priority_keywords = ["CONVÊNIO", "CONVENIO", "DADOS BANCÁRIOS", "DADOS BANCARIOS"]
+        
+        # Peso = vezes que a palavra aparece na lista (ex.: "ITAU" conta 2)
+        self._keyword_weights = Counter(self.keywords)
+        
+        # Texto só ASCII (OCR que perdeu os acentos) não contém as formas
+        # acentuadas ("AGÊNCIA"...): nesse caso elas nem entram na busca
+        self._ascii_high_priority_keywords = [kw for kw in self.high_priority_keywords if kw.isascii()]
+        self._ascii_keyword_weights = {kw: w for kw, w in self._keyword_weights.items() if kw.isascii()}
+        
+        # Autômato Aho-Corasick: uma passada pelo texto encontra todas as
+        # palavras-chave (inclusive sobrepostas, como CONTA em CONTA CORRENTE)
+        self._automaton = None
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword, weight in self._keyword_weights.items():
+                self._automaton.add_word(keyword, (keyword, weight, keyword in self.high_priority_keywords))
+            self._automaton.make_automaton()
     
     def is_relevant_page(self, text: str) -> bool:
         """
@@ -55,29 +81,56 @@ class PageFilter:
         # Converte texto para maiúsculas para comparação case-insensitive
         text_upper = text.upper()
         
-        # Conta quantas palavras-chave aparecem na página
-        keyword_count = sum(1 for keyword in self.keywords if keyword in text_upper)
-        
         # Considera relevante se encontrar pelo menos 2 palavras-chave
         # ou se encontrar palavras-chave muito específicas
-        high_priority_keywords = ["CONVÊNIO", "CONVENIO", "DADOS BANCÁRIOS", "DADOS BANCARIOS"]
-        has_high_priority = any(kw in text_upper for kw in high_priority_keywords)
+        # (para no primeiro critério atingido)
+        if self._automaton is not None:
+            found = set()
+            keyword_count = 0
+            for _, (keyword, weight, high_priority) in self._automaton.iter(text_upper):
+                if high_priority:
+                    return True
+                if keyword not in found:
+                    found.add(keyword)
+                    keyword_count += weight
+                    if keyword_count >= 2:
+                        return True
+            return False
+        
+        if text_upper.isascii():
+            high_priority_keywords = self._ascii_high_priority_keywords
+            keyword_weights = self._ascii_keyword_weights
+        else:
+            high_priority_keywords = self.high_priority_keywords
+            keyword_weights = self._keyword_weights
         
-        return keyword_count >= 2 or has_high_priority
+        if any(kw in text_upper for kw in high_priority_keywords):
+            return True
+        
+        # Conta quantas palavras-chave aparecem na página
+        keyword_count = 0
+        for keyword, weight in keyword_weights.items():
+            if keyword in text_upper:
+                keyword_count += weight
+                if keyword_count >= 2:
+                    return True
+        
+        return False
     
-    def filter_pages(self, ocr_results: List[Dict[str, any]]) -> List[Dict[str, any]]:
+    def filter_pages(self, ocr_results: Iterable[Dict[str, any]]) -> Iterator[Dict[str, any]]:
         """
         Filtra apenas as páginas relevantes do documento
         
+        Generator: aceita qualquer iterável (ex.: os batches de
+        process_pdf_in_batches) sem juntar o documento inteiro na memória
+        
         Args:
-            ocr_results: Lista de resultados do OCR por página
+            ocr_results: Resultados do OCR por página
             [{"page": 1, "text": "...", "has_content": True}, ...]
             
-        Returns:
-            Lista filtrada apenas com páginas relevantes
+        Yields:
+            Apenas as páginas relevantes
         """
-        relevant_pages = []
-        
         for page_data in ocr_results:
             if not page_data.get("has_content", False):
                 continue
@@ -85,27 +138,21 @@ class PageFilter:
             text = page_data.get("text", "")
             
             if self.is_relevant_page(text):
-                relevant_pages.append({
+                yield {
                     "page": page_data["page"],
                     "text": text,
                     "has_content": True
-                })
-        
-        return relevant_pages
+                }
     
-    def get_relevant_text(self, ocr_results: List[Dict[str, any]]) -> str:
+    def get_relevant_text(self, ocr_results: Iterable[Dict[str, any]]) -> str:
         """
         Retorna todo o texto das páginas relevantes concatenado
         
         Args:
-            ocr_results: Lista de resultados do OCR por página
+            ocr_results: Resultados do OCR por página
             
         Returns:
             Texto concatenado de todas as páginas relevantes
         """
-        relevant_pages = self.filter_pages(ocr_results)
-        
-        # Concatena textos das páginas relevantes
-        texts = [page["text"] for page in relevant_pages]
-        
-        return "\n\n".join(texts)
+        # Concatena textos das páginas relevantes (direto do generator)
+        return "\n\n".join(page["text"] for page in self.filter_pages(ocr_results))
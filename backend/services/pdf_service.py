@@ -3,14 +3,127 @@ Serviço para manipulação de PDFs
 Suporta extração seletiva de páginas para controle de memória
 """
 
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PyPDF2 import PdfReader
-from typing import List
-from PIL import Image
+from typing import Iterable, List, Tuple
+import numpy as np
 import logging
+import threading
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pypdfium2 é opcional: sem ele, renderiza com pdf2image (pdftoppm)
+    pdfium = None
 
 logger = logging.getLogger(__name__)
 
+# O PDFium não é thread-safe: uma renderização por vez no processo
+_pdfium_lock = threading.Lock()
+
+
+def render_pages_pdfium(pdf_path: str, start_page: int, end_page: int, dpi: int) -> List[np.ndarray]:
+    """
+    Renderiza páginas com o PDFium, no próprio processo
+    
+    Sem subprocesso do pdftoppm nem arquivos temporários: o PDF é aberto
+    uma vez e cada página vai direto para um array em tons de cinza
+    
+    Args:
+        pdf_path: Caminho do arquivo PDF
+        start_page: Página inicial (1-indexed)
+        end_page: Página final (1-indexed, inclusive)
+        dpi: Resolução da renderização
+        
+    Returns:
+        Lista de arrays uint8 (altura x largura)
+    """
+    images = []
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            for index in range(start_page - 1, end_page):
+                page = pdf[index]
+                try:
+                    bitmap = page.render(scale=dpi / 72, grayscale=True)
+                    # Copia: o array do bitmap aponta para memória do PDFium
+                    images.append(np.array(bitmap.to_numpy()))
+                    bitmap.close()
+                finally:
+                    page.close()
+        finally:
+            pdf.close()
+    return images
+
+
+
+def count_pages(pdf_path: str) -> int:
+    """
+    Número de páginas do PDF sem interpretar as páginas
+    
+    O pdfinfo (poppler, já usado pelo pdf2image) lê só o catálogo do PDF:
+    milissegundos mesmo com milhares de páginas, contra o parse em Python
+    do xref e da árvore de páginas do PyPDF2, que fica como fallback
+    
+    Args:
+        pdf_path: Caminho do arquivo PDF
+        
+    Returns:
+        Número de páginas
+    """
+    try:
+        return int(pdfinfo_from_path(pdf_path)["Pages"])
+    except Exception as e:
+        logger.debug(f"pdfinfo indisponível ({e}), contando páginas com PyPDF2")
+        return len(PdfReader(pdf_path).pages)
+
+
+def page_has_fonts(page) -> bool:
+    """
+    Indica se a página (ou um formulário XObject dela) declara fontes
+    
+    Sem /Font nos recursos não há texto para extrair: página escaneada,
+    só com imagens. A checagem lê um dicionário, sem interpretar o
+    conteúdo da página como o extract_text
+    
+    Args:
+        page: Página do PyPDF2 (ou XObject de formulário)
+        
+    Returns:
+        True se há fontes declaradas
+    """
+    resources = page.get("/Resources")
+    if resources is None:
+        return False
+    resources = resources.get_object()
+    if "/Font" in resources:
+        return True
+    
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return False
+    return any(
+        page_has_fonts(xobject.get_object())
+        for xobject in xobjects.get_object().values()
+        if xobject.get_object().get("/Subtype") == "/Form"
+    )
+
+
+def page_ranges(pages: Iterable[int]) -> List[Tuple[int, int]]:
+    """
+    Agrupa números de página (em ordem crescente) em trechos contínuos
+    
+    Example:
+        >>> page_ranges([1, 2, 3, 5, 8, 9])
+        [(1, 3), (5, 5), (8, 9)]
+    """
+    ranges = []
+    for page in pages:
+        if ranges and ranges[-1][1] == page - 1:
+            ranges[-1] = (ranges[-1][0], page)
+        else:
+            ranges.append((page, page))
+    return ranges
+
 
 class PDFService:
     """Serviço responsável por manipulação de arquivos PDF"""
@@ -33,8 +146,7 @@ class PDFService:
             Número de páginas
         """
         try:
-            reader = PdfReader(pdf_path)
-            return len(reader.pages)
+            return count_pages(pdf_path)
         except Exception as e:
             logger.error(f"Erro ao contar páginas: {e}")
             raise Exception(f"Erro ao ler PDF: {str(e)}")
@@ -44,29 +156,39 @@ class PDFService:
         pdf_path: str, 
         start_page: int, 
         end_page: int
-    ) -> List[Image.Image]:
+    ) -> List:
         """
         Extrai um batch de páginas do PDF como imagens
         
         IMPORTANTE: Usa first_page/last_page para não carregar PDF inteiro
         
+        Com pypdfium2 renderiza no próprio processo (sem um pdftoppm por
+        batch); senão, usa pdf2image
+        
         Args:
             pdf_path: Caminho do arquivo PDF
             start_page: Página inicial (1-indexed)
             end_page: Página final (1-indexed, inclusive)
             
         Returns:
-            Lista de imagens PIL (apenas o batch solicitado)
+            Lista de imagens em tons de cinza (arrays numpy ou PIL modo L,
+            apenas o batch solicitado)
         """
         try:
             logger.info(f"Extraindo páginas {start_page}-{end_page} (DPI: {self.dpi})")
             
+            if pdfium is not None:
+                return render_pages_pdfium(pdf_path, start_page, end_page, self.dpi)
+            
             images = convert_from_path(
                 pdf_path,
                 dpi=self.dpi,
                 first_page=start_page,
                 last_page=end_page,
-                fmt='png',
+                # PGM cru em tons de cinza: o OCR só usa cinza, então não há
+                # PNG para codificar/decodificar nem RGB para converter depois
+                fmt='ppm',
+                grayscale=True,
                 thread_count=2  # Reduzido para não competir com ProcessPool
             )
             
@@ -9,11 +9,58 @@ GARANTE:
 """
 
 import logging
+import uuid
 from typing import Dict, List, Optional
-from services.financial_label_extractor import FinancialLabelExtractor
+
+import numpy as np
+
+from services.financial_label_extractor import FinancialLabelExtractor, ValorRotulado
 
 logger = logging.getLogger(__name__)
 
+# Campos somados nos totais (colunas da matriz de valores)
+CAMPOS_TOTAIS = ('entrada', 'saida', 'aplicacao', 'resgate', 'rendimentos')
+
+# Movimentação com os valores padrão (copiada a cada valor extraído)
+MOVIMENTACAO_PADRAO = {
+    'id': None,
+    'data': None,  # TODO: Extrair data da linha
+    'descricao_item': None,
+    'entrada': 0.0,
+    'saida': 0.0,
+    'saldo': 0.0,
+    'aplicacao': None,
+    'resgate': None,
+    'rendimentos': None,
+    'tarifa_paga': None,
+    'tarifa_devolvida': None,
+    'saldo_tarifa': 0.0,
+    'tipo_documento': 'EXTRATO_CONVENIO_MOVIMENTACAO',
+    'origem_documento': None,
+    'documento_id': None,
+    'linha_origem': 0,
+    'texto_original': None,
+    'metodo_extracao': 'label_based',
+    'confianca': 'ALTO',
+    'valor_validado': True
+}
+
+# Campo do rótulo -> campos da movimentação que recebem o valor
+CAMPOS_DESTINO = {
+    'entrada': ('entrada',),
+    'saida': ('saida',),
+    'saldo': ('saldo',),
+    'saldo_atual': ('saldo',),
+    'saldo_anterior': ('saldo',),
+    'aplicacao': ('aplicacao', 'entrada'),
+    'resgate': ('resgate', 'saida'),
+    'rendimento': ('rendimentos', 'entrada'),
+    'rendimento_bruto': ('rendimentos', 'entrada'),
+    'rendimento_liquido': ('rendimentos', 'entrada'),
+    'tarifa_paga': ('tarifa_paga', 'saida'),
+    'tarifa_devolvida': ('tarifa_devolvida', 'entrada'),
+}
+
 
 class SafeConvenioExtractor:
     """
@@ -54,11 +101,12 @@ class SafeConvenioExtractor:
         movimentacoes = []
         
         # Para cada valor extraído, cria uma movimentação
+        create_movimentacao = self._create_movimentacao_from_label
         for campo, valores_list in valores_por_campo.items():
             for valor_info in valores_list:
-                if valor_info['status_validacao'] == 'OK':
+                if valor_info.status_validacao == 'OK':
                     # Cria movimentação a partir do rótulo
-                    movimentacao = self._create_movimentacao_from_label(
+                    movimentacao = create_movimentacao(
                         valor_info,
                         documento_id,
                         page_num
@@ -71,7 +119,7 @@ class SafeConvenioExtractor:
             'movimentacoes': movimentacoes,
             'valores_raw': valores_por_campo,
             'tem_erros': any(
-                v['status_validacao'] != 'OK'
+                v.status_validacao != 'OK'
                 for values in valores_por_campo.values()
                 for v in values
             )
@@ -79,7 +127,7 @@ class SafeConvenioExtractor:
     
     def _create_movimentacao_from_label(
         self,
-        valor_info: Dict,
+        valor_info: ValorRotulado,
         documento_id: str,
         page_num: int
     ) -> Optional[Dict]:
@@ -94,65 +142,25 @@ class SafeConvenioExtractor:
         Returns:
             Movimentação formatada ou None
         """
-        import uuid
-        from datetime import datetime
+        movimentacao = MOVIMENTACAO_PADRAO.copy()
+        movimentacao['id'] = uuid.uuid4().hex
+        movimentacao['descricao_item'] = valor_info.rotulo
+        movimentacao['origem_documento'] = f'pagina_{page_num}.pdf'
+        movimentacao['documento_id'] = documento_id
+        movimentacao['texto_original'] = valor_info.linha_original
         
-        # Mapeamento de campos para estrutura de movimentação
-        campo = valor_info['campo']
-        valor = valor_info['valor_decimal']
-        
-        movimentacao = {
-            'id': str(uuid.uuid4()),
-            'data': None,  # TODO: Extrair data da linha
-            'descricao_item': valor_info['rotulo'],
-            'entrada': 0.0,
-            'saida': 0.0,
-            'saldo': 0.0,
-            'aplicacao': None,
-            'resgate': None,
-            'rendimentos': None,
-            'tarifa_paga': None,
-            'tarifa_devolvida': None,
-            'saldo_tarifa': 0.0,
-            'tipo_documento': 'EXTRATO_CONVENIO_MOVIMENTACAO',
-            'origem_documento': f'pagina_{page_num}.pdf',
-            'documento_id': documento_id,
-            'linha_origem': 0,
-            'texto_original': valor_info['linha_original'],
-            'metodo_extracao': 'label_based',
-            'confianca': 'ALTO',
-            'valor_validado': True
-        }
-        
-        # Mapeia valor para campo correto
-        if campo == 'entrada':
-            movimentacao['entrada'] = valor
-        elif campo == 'saida':
-            movimentacao['saida'] = valor
-        elif campo in ['saldo', 'saldo_atual', 'saldo_anterior']:
-            movimentacao['saldo'] = valor
-        elif campo == 'aplicacao':
-            movimentacao['aplicacao'] = valor
-            movimentacao['entrada'] = valor
-        elif campo == 'resgate':
-            movimentacao['resgate'] = valor
-            movimentacao['saida'] = valor
-        elif campo in ['rendimento', 'rendimento_bruto', 'rendimento_liquido']:
-            movimentacao['rendimentos'] = valor
-            movimentacao['entrada'] = valor
-        elif campo == 'tarifa_paga':
-            movimentacao['tarifa_paga'] = valor
-            movimentacao['saida'] = valor
-        elif campo == 'tarifa_devolvida':
-            movimentacao['tarifa_devolvida'] = valor
-            movimentacao['entrada'] = valor
+        # Mapeia valor para campo(s) correto(s)
+        valor = valor_info.valor_decimal
+        for destino in CAMPOS_DESTINO.get(valor_info.campo, ()):
+            movimentacao[destino] = valor
         
         return movimentacao
     
     def extract_convenio_data_from_pages(
         self,
         ocr_results: List[Dict],
-        documento_id: str
+        documento_id: str,
+        paginas_extraidas: Optional[List[Dict]] = None
     ) -> Dict:
         """
         Extrai dados de TODAS as páginas com validação
@@ -160,6 +168,8 @@ class SafeConvenioExtractor:
         Args:
             ocr_results: Lista de resultados do OCR
             documento_id: ID do documento
+            paginas_extraidas: Resultados de extract_from_page já calculados
+                               (ex.: pelo pipeline); se None, extrai aqui
             
         Returns:
             Dados completos do convênio validados
@@ -169,10 +179,14 @@ class SafeConvenioExtractor:
         todas_movimentacoes = []
         paginas_com_erro = []
         
+        if paginas_extraidas is None:
+            paginas_extraidas = (
+                self.extract_from_page(ocr_result, documento_id)
+                for ocr_result in ocr_results
+            )
+        
         # Processa cada página
-        for ocr_result in ocr_results:
-            resultado_pagina = self.extract_from_page(ocr_result, documento_id)
-            
+        for resultado_pagina in paginas_extraidas:
             todas_movimentacoes.extend(resultado_pagina['movimentacoes'])
             
             if resultado_pagina['tem_erros']:
@@ -250,9 +264,9 @@ class SafeConvenioExtractor:
             
             movs_pagina = movs_por_pagina.get(page_key, [])
             
-            # Extrai texto para análise
+            # Amostra do texto (os valores já vêm das movimentações: o
+            # relatório não roda o extrator de novo)
             texto = ocr_result.get('text', '')
-            valores_por_campo = self.label_extractor.extract_from_text(texto, page_num)
             
             relatorio_pagina = {
                 'pagina': page_num,
@@ -301,21 +315,30 @@ class SafeConvenioExtractor:
             'count_movimentacoes': len(movimentacoes)
         }
         
-        for mov in movimentacoes:
-            if mov.get('valor_validado', False):  # Apenas valores validados
-                totais['total_entrada'] += mov.get('entrada', 0) or 0
-                totais['total_saida'] += mov.get('saida', 0) or 0
-                totais['total_aplicacao'] += mov.get('aplicacao', 0) or 0
-                totais['total_resgate'] += mov.get('resgate', 0) or 0
-                totais['total_rendimentos'] += mov.get('rendimentos', 0) or 0
+        # Matriz movimentações x CAMPOS_TOTAIS (None conta 0), apenas valores
+        # validados, somada numa redução só. Em centavos int64: soma exata,
+        # sem o erro acumulado de somar floats um a um
+        valores = np.fromiter(
+            (
+                mov.get(campo) or 0
+                for mov in movimentacoes if mov.get('valor_validado', False)
+                for campo in CAMPOS_TOTAIS
+            ),
+            dtype=np.float64
+        ).reshape(-1, len(CAMPOS_TOTAIS))
+        somas = np.rint(valores * 100).astype(np.int64).sum(axis=0)
+        somas = dict(zip(CAMPOS_TOTAIS, somas.tolist()))
+        for campo, soma in somas.items():
+            totais[f'total_{campo}'] = soma / 100
         
-        totais['saldo_final'] = totais['total_entrada'] - totais['total_saida']
+        totais['saldo_final'] = (somas['entrada'] - somas['saida']) / 100
         
         # VALIDAÇÃO FINAL: Totais razoáveis?
         MAX_RAZOAVEL = 1_000_000_000  # 1 bilhão
         campos_bloqueados = []
         
-        for campo, valor in totais.items():
+        # list(): o laço acrescenta chaves "_erro" ao próprio dict
+        for campo, valor in list(totais.items()):
             if isinstance(valor, (int, float)) and abs(valor) > MAX_RAZOAVEL:
                 logger.error(f"🚨 TOTAL ABSURDO em '{campo}': R$ {valor:,.2f}")
                 totais[campo] = None
@@ -37,11 +37,11 @@ print("=" * 80)
 for campo, valores in valores_por_campo.items():
     print(f"\n{campo.upper()}:")
     for v in valores:
-        status_emoji = "✅" if v['status_validacao'] == 'OK' else "❌"
-        print(f"  {status_emoji} Rótulo: {v['rotulo']}")
-        print(f"     Valor: R$ {v['valor_decimal']:,.2f}" if v['valor_decimal'] else f"     Valor: SUSPEITO")
-        print(f"     Página: {v['pagina']}")
-        print(f"     Linha: {v['linha_original'][:60]}...")
+        status_emoji = "✅" if v.status_validacao == 'OK' else "❌"
+        print(f"  {status_emoji} Rótulo: {v.rotulo}")
+        print(f"     Valor: R$ {v.valor_decimal:,.2f}" if v.valor_decimal else f"     Valor: SUSPEITO")
+        print(f"     Página: {v.pagina}")
+        print(f"     Linha: {v.linha_original[:60]}...")
 
 # Calcula totais
 print("\n" + "=" * 80)
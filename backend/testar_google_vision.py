@@ -11,6 +11,9 @@ import os
 from services.google_vision_ocr import GoogleVisionOCR
 import re
 
+# Padrão de valores brasileiros (compilado uma vez)
+VALOR_RE = re.compile(r'\d+[\.,]\d{3}[\.,]\d{2}|\d+[\.,]\d{2}')
+
 print("=" * 100)
 print("TESTE GOOGLE VISION API")
 print("=" * 100)
@@ -47,8 +50,8 @@ try:
     # Processa apenas primeira página
     print("\n⏳ Processando primeira página...")
     
-    from pdf2image import convert_from_path
-    images = convert_from_path(pdf_path, dpi=300, first_page=1, last_page=1)
+    # JPEG direto do poppler, como no processamento real (sem PIL no meio)
+    images = ocr.pdf_to_images_batch(pdf_path, 1, 1)
     
     if not images:
         print("❌ Erro ao converter PDF")
@@ -58,7 +61,12 @@ try:
     
     # OCR
     print("\n⏳ Executando OCR com Google Vision...")
-    texto = ocr.extract_text_from_image(images[0])
+    # Mesmo caminho do processamento real: batch_annotate_images (uma
+    # requisição para até VISION_BATCH_LIMIT páginas)
+    resultado = ocr.process_images(images, [1])[0]
+    if "error" in resultado:
+        raise Exception(resultado["error"])
+    texto = resultado["text"]
     
     print("\n" + "=" * 100)
     print("RESULTADO")
@@ -70,8 +78,7 @@ try:
     print("-" * 100)
     
     # Procura valores
-    padrao_valor = r'\d+[\.,]\d{3}[\.,]\d{2}|\d+[\.,]\d{2}'
-    valores = re.findall(padrao_valor, texto)
+    valores = VALOR_RE.findall(texto)
     
     print(f"\n💰 VALORES ENCONTRADOS: {len(valores)}")
     for i, v in enumerate(valores[:20], 1):
@@ -80,11 +87,8 @@ try:
     # Procura rótulos
     rotulos = ['SALDO ANTERIOR', 'SALDO ATUAL', 'APLICAÇÃO', 'RESGATE', 
                'RENDIMENTO', 'ENTRADA', 'SAÍDA', 'TARIFA']
-    rotulos_encontrados = []
-    
-    for rotulo in rotulos:
-        if rotulo in texto.upper():
-            rotulos_encontrados.append(rotulo)
+    texto_upper = texto.upper()
+    rotulos_encontrados = [rotulo for rotulo in rotulos if rotulo in texto_upper]
     
     print(f"\n🏷️ RÓTULOS ENCONTRADOS: {len(rotulos_encontrados)}")
     for r in rotulos_encontrados:
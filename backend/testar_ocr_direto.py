@@ -6,9 +6,14 @@ import sys
 import io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
+import re
 from services.ocr_service import OCRService
+from services.pdf_service import page_has_fonts
 from PyPDF2 import PdfReader
 
+# Padrão de valores brasileiros (compilado uma vez)
+VALOR_RE = re.compile(r'\d+[\.,]\d{3}[\.,]\d{2}|\d+[\.,]\d{2}')
+
 # Caminho do PDF
 pdf_path = input("Digite o caminho do PDF (ou pressione Enter para usar o último): ").strip()
 
@@ -38,12 +43,15 @@ print("TESTE 1: EXTRAÇÃO DE TEXTO NATIVO (PyPDF2)")
 print("=" * 100)
 
 try:
-    reader = PdfReader(pdf_path)
+    # Arquivo aberto: o PyPDF2 lê sob demanda, sem copiar o PDF inteiro
+    pdf_file = open(pdf_path, 'rb')
+    reader = PdfReader(pdf_file)
     print(f"Total de páginas: {len(reader.pages)}")
     
-    # Testa primeira página
+    # Testa primeira página (sem fontes = só imagem, nem extrai o texto)
     page1 = reader.pages[0]
-    texto_nativo = page1.extract_text()
+    texto_nativo = page1.extract_text() if page_has_fonts(page1) else ""
+    pdf_file.close()
     
     print("\n📄 TEXTO NATIVO DA PÁGINA 1:")
     print("-" * 100)
@@ -66,10 +74,13 @@ try:
     ocr_service = OCRService(dpi=300, batch_size=1)
     
     print("Processando primeira página com OCR...")
-    results = list(ocr_service.process_pdf_in_batches(pdf_path))
+    # Só a página 1, sempre pelo OCR (mesmo se o PDF tiver camada de texto);
+    # com tesserocr, o Tesseract roda no próprio processo
+    images = ocr_service.pdf_to_images_batch(pdf_path, 1, 1)
+    results = [ocr_service.process_image(images[0], 1)] if images else []
     
-    if results and len(results[0]) > 0:
-        texto_ocr = results[0][0].get('text', '')
+    if results:
+        texto_ocr = results[0].get('text', '')
         
         print("\n📄 TEXTO OCR DA PÁGINA 1:")
         print("-" * 100)
@@ -80,10 +91,7 @@ try:
         print("\n🔍 PROCURANDO VALORES FINANCEIROS NO TEXTO OCR:")
         print("-" * 100)
         
-        import re
-        # Padrão de valores brasileiros
-        padrao_valor = r'\d+[\.,]\d{3}[\.,]\d{2}|\d+[\.,]\d{2}'
-        valores = re.findall(padrao_valor, texto_ocr)
+        valores = VALOR_RE.findall(texto_ocr)
         
         print(f"Valores encontrados: {len(valores)}")
         for i, v in enumerate(valores[:20], 1):
@@ -94,11 +102,13 @@ try:
         print("-" * 100)
         rotulos = ['SALDO ANTERIOR', 'SALDO ATUAL', 'APLICAÇÃO', 'RESGATE', 
                    'RENDIMENTO', 'ENTRADA', 'SAÍDA']
+        texto_upper = texto_ocr.upper()
         for rotulo in rotulos:
-            if rotulo in texto_ocr.upper():
+            # Uma busca só: a posição serve para o contexto
+            pos = texto_upper.find(rotulo)
+            if pos >= 0:
                 print(f"  ✅ {rotulo} - ENCONTRADO")
                 # Mostra contexto
-                pos = texto_ocr.upper().find(rotulo)
                 contexto = texto_ocr[max(0, pos-20):pos+80]
                 print(f"     Contexto: {contexto}")
             else:
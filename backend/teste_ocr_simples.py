@@ -11,6 +11,14 @@ from pdf2image import convert_from_path
 import pytesseract
 import re
 
+try:
+    from tesserocr import PyTessBaseAPI
+except ImportError:  # tesserocr é opcional: sem ele, usa pytesseract (um subprocesso por configuração)
+    PyTessBaseAPI = None
+
+# Padrão de valores brasileiros (compilado uma vez)
+VALOR_RE = re.compile(r'\d+[\.,]\d{3}[\.,]\d{2}|\d+[\.,]\d{2}')
+
 # Caminho do PDF
 pdf_path = input("Digite o caminho do PDF: ").strip().strip('"').strip("'")
 
@@ -32,36 +40,41 @@ try:
     
     # Testa 3 configurações diferentes de Tesseract
     configs = [
-        ('PSM 6 (Bloco de texto)', '--oem 3 --psm 6 -l por'),
-        ('PSM 4 (Coluna única)', '--oem 3 --psm 4 -l por'),
-        ('PSM 3 (Automático)', '--oem 3 --psm 3 -l por'),
+        ('PSM 6 (Bloco de texto)', '--oem 3 --psm 6 -l por', 6),
+        ('PSM 4 (Coluna única)', '--oem 3 --psm 4 -l por', 4),
+        ('PSM 3 (Automático)', '--oem 3 --psm 3 -l por', 3),
     ]
     
-    for nome, config in configs:
+    # Com tesserocr o modelo "por" é carregado uma vez para as 3 configurações
+    api = PyTessBaseAPI(lang='por') if PyTessBaseAPI is not None else None
+    
+    for nome, config, psm in configs:
         print("\n" + "-" * 100)
         print(f"🔍 TESTANDO: {nome}")
         print("-" * 100)
         
         try:
-            texto = pytesseract.image_to_string(images[0], config=config)
+            if api is not None:
+                api.SetPageSegMode(psm)
+                api.SetImage(images[0])
+                texto = api.GetUTF8Text()
+            else:
+                texto = pytesseract.image_to_string(images[0], config=config)
             
             print(f"\n📄 TEXTO EXTRAÍDO ({len(texto)} caracteres):")
             print(texto[:500])
             
             # Procura valores
-            padrao_valor = r'\d+[\.,]\d{3}[\.,]\d{2}|\d+[\.,]\d{2}'
-            valores = re.findall(padrao_valor, texto)
+            valores = VALOR_RE.findall(texto)
             
             print(f"\n💰 VALORES ENCONTRADOS: {len(valores)}")
             for i, v in enumerate(valores[:10], 1):
                 print(f"  {i}. {v}")
             
             # Procura rótulos chave
-            rotulos_encontrados = []
             rotulos = ['SALDO', 'ENTRADA', 'SAÍDA', 'APLICAÇÃO', 'RESGATE', 'RENDIMENTO']
-            for rotulo in rotulos:
-                if rotulo in texto.upper():
-                    rotulos_encontrados.append(rotulo)
+            texto_upper = texto.upper()
+            rotulos_encontrados = [rotulo for rotulo in rotulos if rotulo in texto_upper]
             
             print(f"\n🏷️ RÓTULOS ENCONTRADOS: {len(rotulos_encontrados)}")
             for r in rotulos_encontrados:
@@ -81,6 +94,9 @@ try:
         except Exception as e:
             print(f"❌ Erro: {e}")
     
+    if api is not None:
+        api.End()
+    
     print("\n" + "=" * 100)
     print("CONCLUSÃO")
     print("=" * 100)
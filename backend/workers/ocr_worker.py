@@ -4,8 +4,13 @@ CRÍTICO: Este código roda fora do FastAPI, em ProcessPoolExecutor
 """
 
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from operator import itemgetter
 from typing import List, Dict
-from datetime import datetime
 
 # Imports locais (precisam ser reimportados no processo filho)
 import sys
@@ -13,13 +18,125 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from services.ocr_service import OCRService
-from services.pdf_service import PDFService
+from services.pdf_service import PDFService, page_ranges
 from services.page_filter import PageFilter
 from services.extractor import DataExtractor
 from jobs.models import JobResult, JobStatus
 
 logger = logging.getLogger(__name__)
 
+# Batches já renderizados esperando o OCR (limita a memória de imagens)
+RENDER_QUEUE_SIZE = 2
+
+# Intervalo (s) em que a thread de renderização, com a fila cheia, confere
+# se o job foi interrompido
+RENDER_PUT_TIMEOUT = 0.5
+
+# Serviços do processo (pdf, ocr, filtro, extrator), criados uma vez por
+# processo e reaproveitados entre jobs
+_SERVICES = None
+
+# Pool de processos para o OCR das páginas (None com tesserocr: threads),
+# também mantido entre jobs
+_PAGE_POOL = None
+
+# Fila de progresso para o processo principal (multiprocessing.Queue)
+_PROGRESS_QUEUE = None
+
+
+def init_worker(progress_queue=None):
+    """
+    Initializer do ProcessPoolExecutor: carrega serviços uma vez por processo
+    
+    O Tesseract (handles do tesserocr, com o modelo já carregado), o pool de
+    páginas e os extratores ficam prontos de um job para o outro, em vez de
+    recriados a cada job
+    
+    Args:
+        progress_queue: Fila para update_job_progress (opcional)
+    """
+    global _SERVICES, _PAGE_POOL, _PROGRESS_QUEUE
+    _PROGRESS_QUEUE = progress_queue
+    pdf_service = PDFService(dpi=200)  # DPI reduzido para economizar RAM
+    ocr_service = OCRService(dpi=pdf_service.dpi)  # DPI real das imagens (define a ampliação)
+    _SERVICES = (pdf_service, ocr_service, PageFilter(), DataExtractor())
+    _PAGE_POOL = ocr_service.create_page_pool(ocr_service.batch_size)
+
+
+def _restart_page_pool(ocr_service: OCRService):
+    """Descarta o pool de páginas quebrado e cria outro no lugar"""
+    global _PAGE_POOL
+    if _PAGE_POOL is not None:
+        _PAGE_POOL.shutdown(wait=False, cancel_futures=True)
+    _PAGE_POOL = ocr_service.create_page_pool(ocr_service.batch_size)
+
+
+def _ocr_images(ocr_service: OCRService, images: List, page_nums: List[int]) -> List[Dict]:
+    """
+    OCR de um batch no pool de páginas do processo
+    
+    O pool é mantido entre jobs: se um processo filho morrer (ex.: falta de
+    memória no Tesseract), o pool fica quebrado e todo job seguinte falharia.
+    O pool é recriado e o batch refeito uma vez; se quebrar de novo, o pool
+    é recriado outra vez e só este batch falha
+    """
+    try:
+        return ocr_service.process_images(images, page_nums, _PAGE_POOL)
+    except BrokenProcessPool:
+        logger.warning("Pool de páginas quebrado (processo filho morreu), recriando e refazendo o batch")
+        _restart_page_pool(ocr_service)
+    
+    try:
+        return ocr_service.process_images(images, page_nums, _PAGE_POOL)
+    except BrokenProcessPool:
+        _restart_page_pool(ocr_service)
+        raise
+
+
+def _render_batches(
+    pdf_service: PDFService,
+    ocr_service: OCRService,
+    pdf_path: str,
+    batches: List[tuple],
+    out_q: queue.Queue,
+    stop: threading.Event
+):
+    """
+    Thread de renderização: converte os batches na ordem e os enfileira
+    
+    Enquanto o OCR processa um batch, os próximos já são convertidos
+    (o pdftoppm roda fora do GIL). Páginas com camada de texto (PDF
+    híbrido) usam esse texto e nem são convertidas. Cada item é
+    ((textos, imagens, páginas), None) ou (None, erro) se o batch falhar.
+    Para quando `stop` é sinalizado (job interrompido), sem ficar presa
+    na fila cheia
+    """
+    for start_page, end_page in batches:
+        if stop.is_set():
+            return
+        try:
+            text_layer = ocr_service.text_layer_pages(pdf_path, start_page, end_page)
+            pending = (page_num for page_num in range(start_page, end_page + 1) if page_num not in text_layer)
+            
+            # Uma conversão por trecho contínuo de páginas sem texto
+            images, page_nums = [], []
+            for range_start, range_end in page_ranges(pending):
+                images.extend(pdf_service.extract_page_batch(pdf_path, range_start, range_end))
+                page_nums.extend(range(range_start, range_end + 1))
+            
+            item = ((text_layer, images, page_nums), None)
+        except Exception as e:
+            item = (None, e)
+        
+        while True:
+            if stop.is_set():
+                return
+            try:
+                out_q.put(item, timeout=RENDER_PUT_TIMEOUT)
+                break
+            except queue.Full:
+                continue
+
 
 def process_ocr_job(job_id: str, pdf_path: str, callback_update=None) -> JobResult:
     """
@@ -35,16 +152,19 @@ def process_ocr_job(job_id: str, pdf_path: str, callback_update=None) -> JobResu
     Returns:
         JobResult com dados extraídos ou erro
     """
-    start_time = datetime.now()
+    start_time = time.perf_counter()
+    extract_pool = None
+    render_thread = None
+    render_q = None
+    render_stop = threading.Event()
     
     try:
         logger.info(f"[{job_id}] Iniciando processamento OCR")
         
-        # Inicializa serviços (cada processo tem sua própria instância)
-        pdf_service = PDFService(dpi=200)  # DPI reduzido para economizar RAM
-        ocr_service = OCRService()
-        page_filter = PageFilter()
-        extractor = DataExtractor()
+        # Serviços do processo (cada processo tem sua própria instância)
+        if _SERVICES is None:
+            init_worker()
+        pdf_service, ocr_service, page_filter, extractor = _SERVICES
         
         # 1. Conta páginas sem carregar conteúdo
         total_pages = pdf_service.get_page_count(pdf_path)
@@ -56,63 +176,84 @@ def process_ocr_job(job_id: str, pdf_path: str, callback_update=None) -> JobResu
         # 2. Divide em batches (10 páginas por vez)
         batches = pdf_service.calculate_batches(total_pages, batch_size=10)
         
-        all_ocr_results = []
+        # Threads de extração (uma tarefa por página relevante)
+        extract_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        
+        # Nenhum texto fica guardado: cada batch é filtrado e extraído assim
+        # que sai do OCR, e só os registros (pequenos) se acumulam. A memória
+        # fica O(batch), não O(documento)
+        records = []
+        relevant_count = 0
         processed_count = 0
         
-        # 3. Processa cada batch sequencialmente
+        # 3. Processa cada batch sequencialmente (a renderização vai na frente,
+        # numa thread própria)
+        render_q = queue.Queue(maxsize=RENDER_QUEUE_SIZE)
+        render_thread = threading.Thread(
+            target=_render_batches,
+            args=(pdf_service, ocr_service, pdf_path, batches, render_q, render_stop),
+            name=f"render-{job_id}",
+            daemon=True
+        )
+        render_thread.start()
+        
         for batch_num, (start_page, end_page) in enumerate(batches, 1):
             logger.info(f"[{job_id}] Batch {batch_num}/{len(batches)}: páginas {start_page}-{end_page}")
+            batch_results = []
             
             try:
-                # Extrai apenas este batch de páginas
-                images = pdf_service.extract_page_batch(pdf_path, start_page, end_page)
+                # Apenas este batch de páginas (já convertido pela thread)
+                batch, error = render_q.get()
+                if error is not None:
+                    raise error
+                text_layer, images, page_nums = batch
+                
+                # OCR das páginas do batch em paralelo (erros ficam por página)
+                batch_results = _ocr_images(ocr_service, images, page_nums)
                 
-                # OCR em cada página do batch
-                for idx, image in enumerate(images):
-                    page_num = start_page + idx
-                    
-                    try:
-                        # Pré-processa e extrai texto
-                        processed_img = ocr_service.preprocess_image(image)
-                        text = ocr_service.extract_text_from_image(processed_img)
-                        
-                        all_ocr_results.append({
-                            "page": page_num,
-                            "text": text,
-                            "has_content": len(text.strip()) > 0
-                        })
-                        
-                        # Atualiza progresso
+                # Libera batch inteiro
+                del batch, images
+                
+                # Páginas com camada de texto entram sem OCR
+                if text_layer:
+                    batch_results.extend(
+                        {"page": page_num, "text": text, "has_content": True}
+                        for page_num, text in text_layer.items()
+                    )
+                    batch_results.sort(key=itemgetter("page"))
+                
+                # Atualiza progresso
+                for result in batch_results:
+                    if "error" not in result:
                         processed_count += 1
                         if callback_update:
                             callback_update(job_id, "progress", processed_count)
-                        
-                    except Exception as e:
-                        logger.error(f"[{job_id}] Erro na página {page_num}: {e}")
-                        all_ocr_results.append({
-                            "page": page_num,
-                            "text": "",
-                            "has_content": False,
-                            "error": str(e)
-                        })
-                    
-                    # Libera memória imediatamente
-                    del image
-                    if 'processed_img' in locals():
-                        del processed_img
-                
-                # Libera batch inteiro
-                del images
                 
             except Exception as e:
                 logger.error(f"[{job_id}] Erro no batch {batch_num}: {e}")
                 # Continua para próximo batch
+            
+            # 4. Filtra páginas relevantes do batch
+            texts = [page["text"] for page in page_filter.filter_pages(batch_results)]
+            del batch_results
+            relevant_count += len(texts)
+            
+            # 5. Extrai dados bancários do batch (map preserva a ordem para
+            # a deduplicação)
+            records.extend(record for record in extract_pool.map(extractor.extract_record, texts) if record)
+            del texts
         
-        # 4. Filtra páginas relevantes
-        logger.info(f"[{job_id}] Filtrando páginas relevantes")
-        relevant_pages = page_filter.filter_pages(all_ocr_results)
+        extract_pool.shutdown()
+        extract_pool = None
         
-        if not relevant_pages:
+        # OCR terminou: o PDF não é mais lido, libera o disco já
+        try:
+            os.unlink(pdf_path)
+        except OSError as e:
+            logger.warning(f"[{job_id}] Não foi possível remover PDF: {e}")
+        
+        logger.info(f"[{job_id}] {relevant_count} páginas relevantes")
+        if not relevant_count:
             return JobResult(
                 job_id=job_id,
                 status=JobStatus.ERROR,
@@ -123,24 +264,21 @@ def process_ocr_job(job_id: str, pdf_path: str, callback_update=None) -> JobResu
                 error_message="Nenhuma página relevante encontrada no documento"
             )
         
-        # 5. Extrai dados bancários
-        logger.info(f"[{job_id}] Extraindo dados bancários de {len(relevant_pages)} páginas")
-        texts = [page["text"] for page in relevant_pages]
-        extracted_data = extractor.extract_multiple_records(texts)
+        extracted_data = extractor.deduplicate_records(records)
         
         if not extracted_data:
             return JobResult(
                 job_id=job_id,
                 status=JobStatus.ERROR,
                 total_pages=total_pages,
-                relevant_pages=len(relevant_pages),
+                relevant_pages=relevant_count,
                 records_found=0,
                 items=[],
                 error_message="Nenhum dado bancário encontrado"
             )
         
         # 6. Retorna resultado
-        elapsed = (datetime.now() - start_time).total_seconds()
+        elapsed = time.perf_counter() - start_time
         
         logger.info(f"[{job_id}] Concluído: {len(extracted_data)} registros em {elapsed:.1f}s")
         
@@ -148,7 +286,7 @@ def process_ocr_job(job_id: str, pdf_path: str, callback_update=None) -> JobResu
             job_id=job_id,
             status=JobStatus.DONE,
             total_pages=total_pages,
-            relevant_pages=len(relevant_pages),
+            relevant_pages=relevant_count,
             records_found=len(extracted_data),
             items=extracted_data,
             processing_time_seconds=elapsed
@@ -165,6 +303,21 @@ def process_ocr_job(job_id: str, pdf_path: str, callback_update=None) -> JobResu
             items=[],
             error_message=str(e)
         )
+    
+    finally:
+        if extract_pool is not None:
+            extract_pool.shutdown()
+        
+        # Job interrompido no meio: para a renderização e libera as imagens
+        # já enfileiradas (o processo do worker é reaproveitado)
+        if render_thread is not None:
+            render_stop.set()
+            try:
+                while True:
+                    render_q.get_nowait()
+            except queue.Empty:
+                pass
+            render_thread.join()
 
 
 # Callback adapter para atualizar JobManager de dentro do worker
@@ -172,10 +325,13 @@ def update_job_progress(job_id: str, event: str, value: any):
     """
     Adapter para comunicação worker -> JobManager
     
-    LIMITAÇÃO: Em ProcessPoolExecutor puro, não há comunicação direta
-    Solução atual: logging apenas
-    Solução futura: usar Queue ou Redis
+    Envia (job_id, evento, valor) pela fila de init_worker; no processo
+    principal, JobManager.consume_progress aplica o evento. Sem fila,
+    apenas registra no log
     """
+    if _PROGRESS_QUEUE is not None:
+        _PROGRESS_QUEUE.put((job_id, event, value))
+    
     if event == "start":
         logger.info(f"[{job_id}] Total de páginas: {value}")
     elif event == "progress":